@@ -1,2 +1,4 @@
 # app/__init__.py
 __version__ = "0.1.0"
+
+from app import config  # noqa: E402,F401  (loads .env before any submodule reads settings)
@@ -0,0 +1,244 @@
+# app/attachment_store.py
+import os
+import re
+import base64
+import shutil
+import hashlib
+import tempfile
+import threading
+from pathlib import Path
+
+ATTACHMENT_ROOT = Path(os.getenv("ATTACHMENT_ROOT", "/tmp/llm_attachments"))
+OBJECTS_DIR = ATTACHMENT_ROOT / "objects"
+TASKS_DIR = ATTACHMENT_ROOT / "tasks"
+# Upper bound for the shared object store; least recently used objects go first
+ATTACHMENT_STORE_MAX_BYTES = int(os.getenv("ATTACHMENT_STORE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+OBJECTS_DIR.mkdir(parents=True, exist_ok=True)
+TASKS_DIR.mkdir(parents=True, exist_ok=True)
+
+# Base64 characters decoded per step (multiple of 4 so chunks decode independently)
+DECODE_CHUNK_CHARS = 256 * 1024
+# Bytes read per step when hashing a decoded file
+HASH_CHUNK_BYTES = 1024 * 1024
+_NON_B64 = re.compile(r"[^A-Za-z0-9+/=]")
+# Fields of a decoded attachment that identify it in the object store (see attachment_refs)
+REF_FIELDS = ("name", "mime", "size", "sha256", "git_sha")
+
+store_stats = {"decoded": 0, "deduplicated": 0, "evicted": 0}
+# Held while an object is installed and linked into a task view, and while cleanup evicts,
+# so an object is never evicted between being found in the store and being linked
+_store_lock = threading.Lock()
+
+
+def _decode_base64_to_files(url: str, start: int, path: Path, b64_path: Path):
+    """
+    Stream the base64 payload url[start:] to `path` (decoded) and `b64_path` (as-is)
+    chunk by chunk. Returns (size, sha256 hex digest, git blob SHA).
+    """
+    digest = hashlib.sha256()
+    size = 0
+    carry = ""
+    with open(path, "wb") as out, open(b64_path, "w", encoding="ascii") as b64_out:
+        for pos in range(start, len(url), DECODE_CHUNK_CHARS):
+            # Drop characters b64decode would ignore anyway (whitespace, line breaks)
+            piece = _NON_B64.sub("", url[pos:pos + DECODE_CHUNK_CHARS])
+            b64_out.write(piece)
+            piece = carry + piece
+            usable = len(piece) - len(piece) % 4
+            carry = piece[usable:]
+            chunk = base64.b64decode(piece[:usable])
+            out.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+        if carry:
+            # Raises binascii.Error ("Incorrect padding") just like a whole-string decode
+            chunk = base64.b64decode(carry)
+            out.write(chunk)
+            digest.update(chunk)
+            size += len(chunk)
+
+    # The git blob header carries the size, known only now, so the content is hashed from the file
+    git_sha = hashlib.sha1(b"blob %d\0" % size)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b""):
+            git_sha.update(chunk)
+    return size, digest.hexdigest(), git_sha.hexdigest()
+
+
+def _object_path(sha256: str) -> Path:
+    return OBJECTS_DIR / sha256[:2] / sha256
+
+
+def _install(tmp: Path, final: Path) -> bool:
+    """Link tmp into place unless an identical object already exists. Returns True if installed."""
+    try:
+        os.link(tmp, final)
+        return True
+    except FileExistsError:
+        return False
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def _link_view(src: Path, dst: Path) -> None:
+    dst.unlink(missing_ok=True)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def store_data_uri(url: str, view_path: Path = None):
+    """
+    Decode a data URI into the object store, keyed by the sha256 of its decoded bytes,
+    and link it to `view_path` if given.
+    Returns (mime, size, sha256, git blob SHA, object path, base64 path).
+    """
+    comma = url.index(",")
+    mime = url[5:comma].split(";")[0]
+    fd, tmp_name = tempfile.mkstemp(dir=OBJECTS_DIR, suffix=".part")
+    os.close(fd)
+    tmp = Path(tmp_name)
+    tmp_b64 = Path(tmp_name + ".b64")
+    try:
+        size, sha256, git_sha = _decode_base64_to_files(url, comma + 1, tmp, tmp_b64)
+    except Exception:
+        tmp.unlink(missing_ok=True)
+        tmp_b64.unlink(missing_ok=True)
+        raise
+
+    obj = _object_path(sha256)
+    b64_obj = obj.with_name(obj.name + ".b64")
+    with _store_lock:
+        obj.parent.mkdir(exist_ok=True)
+        installed = _install(tmp, obj)
+        _install(tmp_b64, b64_obj)
+        if installed:
+            store_stats["decoded"] += 1
+        else:
+            store_stats["deduplicated"] += 1
+            # Mark as recently used for LRU cleanup
+            os.utime(obj)
+        if view_path is not None:
+            # The view link raises the link count, which keeps cleanup away from the object
+            _link_view(obj, view_path)
+    return mime, size, sha256, git_sha, obj, b64_obj
+
+
+def link_object(sha256: str, view_path: Path):
+    """
+    Link an object already in the store to `view_path`, unless that view is still in place.
+    Returns (object path, base64 path); raises FileNotFoundError when it was evicted.
+    """
+    obj = _object_path(sha256)
+    b64_obj = obj.with_name(obj.name + ".b64")
+    with _store_lock:
+        if not view_path.exists():
+            if not obj.exists():
+                raise FileNotFoundError(f"object {sha256[:12]} is no longer in the attachment store")
+            _link_view(obj, view_path)
+    return obj, b64_obj
+
+
+def task_dir(task_key: str) -> Path:
+    return TASKS_DIR / hashlib.sha256(task_key.encode("utf-8")).hexdigest()[:24]
+
+
+def decode_attachments(attachments, task_key: str = "default"):
+    """
+    attachments: list of {name, url: data:<mime>;base64,<b64>}, or references returned by
+    attachment_refs for attachments already in the store
+    Stores each attachment once in the content-addressed object store and exposes it
+    under a per-task directory, so concurrent tasks never overwrite each other's files.
+    Returns list of dicts: {"name", "path", "b64_path", "mime", "size", "sha256", "git_sha"}
+    Undecodable data URIs are skipped; a reference whose object is gone raises
+    FileNotFoundError, since the job would otherwise go ahead without that attachment.
+    """
+    view = task_dir(task_key)
+    view.mkdir(parents=True, exist_ok=True)
+    saved = []
+    for att in attachments or []:
+        name = att.get("name") or "attachment"
+        url = att.get("url", "")
+        if not url.startswith("data:") and not att.get("sha256"):
+            continue
+        path = view / os.path.basename(name)
+        if not url.startswith("data:"):
+            obj, b64_obj = link_object(att["sha256"], path)
+            saved.append({
+                "name": name,
+                "path": str(path),
+                "b64_path": str(b64_obj),
+                "mime": att["mime"],
+                "size": att["size"],
+                "sha256": att["sha256"],
+                "git_sha": att.get("git_sha"),
+            })
+            continue
+        try:
+            mime, size, sha256, git_sha, obj, b64_obj = store_data_uri(url, path)
+            saved.append({
+                "name": name,
+                "path": str(path),
+                "b64_path": str(b64_obj),
+                "mime": mime,
+                "size": size,
+                "sha256": sha256,
+                "git_sha": git_sha,
+            })
+        except Exception as e:
+            print("Failed to decode attachment", name, e)
+    return saved
+
+
+def attachment_refs(saved) -> list:
+    """References to decoded attachments, small enough to persist in place of their data URIs."""
+    return [{field: att.get(field) for field in REF_FIELDS} for att in saved]
+
+
+def release_task(task_key: str) -> None:
+    """Remove a task's attachment view; the shared objects stay for reuse."""
+    shutil.rmtree(task_dir(task_key), ignore_errors=True)
+
+
+def cleanup(max_bytes: int = ATTACHMENT_STORE_MAX_BYTES) -> int:
+    """
+    Evict least recently used objects until the store fits in max_bytes.
+    Objects still linked into a task view are skipped. Returns the number evicted.
+    """
+    objects = []
+    total = 0
+    for path in OBJECTS_DIR.glob("*/*"):
+        if path.suffix == ".b64":
+            continue
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            continue
+        b64_path = path.with_name(path.name + ".b64")
+        b64_size = b64_path.stat().st_size if b64_path.exists() else 0
+        objects.append((st.st_mtime, path, b64_path, st.st_size + b64_size))
+        total += st.st_size + b64_size
+
+    evicted = 0
+    with _store_lock:
+        for _, path, b64_path, size in sorted(objects, key=lambda o: o[0]):
+            if total <= max_bytes:
+                break
+            try:
+                # Re-checked under the lock: a task may have linked it since the scan
+                if path.stat().st_nlink > 1:
+                    continue
+            except FileNotFoundError:
+                continue
+            path.unlink(missing_ok=True)
+            b64_path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+    store_stats["evicted"] += evicted
+    return evicted
+
+
+def get_store_stats() -> dict:
+    return dict(store_stats)
@@ -2,6 +2,88 @@
 import re
 import json
 
+# README terms, checked in this order against the check text
+README_CHECKS = (
+    ("professional", ("overview", "setup", "usage")),
+    ("contains overview", ("overview",)),
+    ("contains setup", ("setup",)),
+    ("contains usage", ("usage",)),
+    ("contains license", ("license",)),
+    ("contains features", ("features",)),
+)
+README_TERMS = ("overview", "setup", "usage", "license", "features")
+
+# JS check patterns, checked in this order against the expression; each maps to
+# the case-sensitive code needles that satisfy it
+JS_PATTERNS = (
+    ("document.title", ("document.title",)),
+    ("querySelector", ("querySelector",)),
+    ("getElementById", ("getElementById",)),
+    ("innerHTML", ("innerHTML", "textContent")),
+    ("fetch", ("fetch(",)),
+    ("addEventListener", ("addEventListener",)),
+)
+URL_NEEDLES = ("url", "params", "URLSearchParams")
+HTML_NEEDLES = URL_NEEDLES + tuple(n for _, needles in JS_PATTERNS for n in needles)
+
+STOP_WORDS = frozenset({"the", "a", "an", "and", "or", "is", "are", "be", "to", "for", "of", "in", "on", "with", "at", "by", "from"})
+_WORD = re.compile(r"\w+")
+
+
+def _needle_matcher(needles) -> re.Pattern:
+    """
+    One regex that reports every needle occurrence in a single pass.
+    The zero-width lookahead lets matches overlap, so no needle is shadowed by another.
+    """
+    alternatives = sorted(set(needles), key=len, reverse=True)
+    return re.compile("(?=(" + "|".join(re.escape(n) for n in alternatives) + "))")
+
+
+_HTML_MATCHER = _needle_matcher(HTML_NEEDLES)
+_README_MATCHER = _needle_matcher(README_TERMS)
+
+
+def _find_needles(matcher: re.Pattern, text: str, wanted: int) -> set:
+    found = set()
+    for m in matcher.finditer(text):
+        found.add(m.group(1))
+        if len(found) == wanted:
+            break
+    return found
+
+
+class DocumentIndex:
+    """
+    Generated HTML and README preprocessed once for all checks: fixed needles
+    are matched in a single pass and the lowercase word vocabulary is indexed
+    for keyword lookups.
+    """
+
+    def __init__(self, html_code: str, readme: str):
+        self.html_code = html_code
+        self.readme = readme
+        self.readme_len = len(readme)
+        self.html_len = len(html_code)
+        self.html_needles = _find_needles(_HTML_MATCHER, html_code, len(set(HTML_NEEDLES)))
+        self.readme_terms = _find_needles(_README_MATCHER, readme.lower(), len(README_TERMS))
+        self._words = None
+        self._vocab = None
+
+    def _build_vocab(self):
+        words = set(_WORD.findall(self.html_code.lower()))
+        words.update(_WORD.findall(self.readme.lower()))
+        self._words = words
+        # Keywords are runs of word characters, so a substring hit in the document
+        # is always a substring of one word; "\0" keeps words apart
+        self._vocab = "\0".join(words)
+
+    def has_keyword(self, keyword: str) -> bool:
+        """Same result as `keyword in (html + " " + readme).lower()` for word-only keywords."""
+        if self._words is None:
+            self._build_vocab()
+        return keyword in self._words or keyword in self._vocab
+
+
 def validate_checks(html_code: str, readme: str, checks: list) -> dict:
     """
     Validate generated code against a list of checks.
@@ -32,8 +114,9 @@ def validate_checks(html_code: str, readme: str, checks: list) -> dict:
             "message": "No checks specified"
         }
     
+    index = DocumentIndex(html_code, readme)
     for check in checks:
-        result = validate_single_check(check, html_code, readme)
+        result = validate_single_check(check, html_code, readme, index)
         results.append(result)
     
     passed_count = sum(1 for r in results if r["passed"])
@@ -49,23 +132,25 @@ def validate_checks(html_code: str, readme: str, checks: list) -> dict:
     }
 
 
-def validate_single_check(check: str, html_code: str, readme: str) -> dict:
+def validate_single_check(check: str, html_code: str, readme: str, index: DocumentIndex = None) -> dict:
     """Validate a single check against the code."""
     
     check = check.strip()
+    check_lower = check.lower()
+    index = index or DocumentIndex(html_code, readme)
     
     # Static text checks
-    if check.lower().startswith("repo has"):
+    if check_lower.startswith("repo has"):
         return validate_repo_check(check)
-    elif check.lower().startswith("readme"):
-        return validate_readme_check(check, readme)
-    elif check.lower().startswith("page"):
-        return validate_page_check(check, html_code)
+    elif check_lower.startswith("readme"):
+        return validate_readme_check(check, readme, index)
+    elif check_lower.startswith("page"):
+        return validate_page_check(check, html_code, index)
     elif check.startswith("js:"):
-        return validate_js_check(check, html_code)
+        return validate_js_check(check, html_code, index)
     else:
         # Generic check - look for keywords in code
-        return validate_generic_check(check, html_code, readme)
+        return validate_generic_check(check, html_code, readme, index)
 
 
 def validate_repo_check(check: str) -> dict:
@@ -96,28 +181,17 @@ def validate_repo_check(check: str) -> dict:
     }
 
 
-def validate_readme_check(check: str, readme: str) -> dict:
+def validate_readme_check(check: str, readme: str, index: DocumentIndex = None) -> dict:
     """Validate README quality checks."""
     
     check_lower = check.lower()
-    readme_lower = readme.lower()
-    
-    checks_map = {
-        "professional": (
-            len(readme) > 500 and
-            "overview" in readme_lower and
-            "setup" in readme_lower and
-            "usage" in readme_lower
-        ),
-        "contains overview": "overview" in readme_lower,
-        "contains setup": "setup" in readme_lower,
-        "contains usage": "usage" in readme_lower,
-        "contains license": "license" in readme_lower,
-        "contains features": "features" in readme_lower,
-    }
+    index = index or DocumentIndex("", readme)
     
-    for key, condition in checks_map.items():
+    for key, terms in README_CHECKS:
         if key in check_lower:
+            condition = all(t in index.readme_terms for t in terms)
+            if key == "professional":
+                condition = index.readme_len > 500 and condition
             return {
                 "check": check,
                 "passed": condition,
@@ -126,23 +200,24 @@ def validate_readme_check(check: str, readme: str) -> dict:
             }
     
     # Default: check if readme has minimum content
-    passed = len(readme) > 300
+    passed = index.readme_len > 300
     return {
         "check": check,
         "passed": passed,
-        "reason": f"README length: {len(readme)} chars",
+        "reason": f"README length: {index.readme_len} chars",
         "type": "readme"
     }
 
 
-def validate_page_check(check: str, html_code: str) -> dict:
+def validate_page_check(check: str, html_code: str, index: DocumentIndex = None) -> dict:
     """Validate page content checks."""
     
     check_lower = check.lower()
     
     # "Page displays captcha URL"
     if "display" in check_lower and "url" in check_lower:
-        has_url_param = "url" in html_code or "params" in html_code or "URLSearchParams" in html_code
+        index = index or DocumentIndex(html_code, "")
+        has_url_param = any(n in index.html_needles for n in URL_NEEDLES)
         return {
             "check": check,
             "passed": has_url_param,
@@ -176,7 +251,7 @@ def validate_page_check(check: str, html_code: str) -> dict:
     }
 
 
-def validate_js_check(check: str, html_code: str) -> dict:
+def validate_js_check(check: str, html_code: str, index: DocumentIndex = None) -> dict:
     """
     Validate JavaScript-based checks.
     
@@ -186,29 +261,20 @@ def validate_js_check(check: str, html_code: str) -> dict:
     """
     
     js_expr = check.replace("js:", "").strip()
-    
-    # Check if required patterns exist in code
-    checks_map = {
-        "document.title": "document.title" in html_code,
-        "querySelector": "querySelector" in html_code,
-        "getElementById": "getElementById" in html_code,
-        "innerHTML": "innerHTML" in html_code or "textContent" in html_code,
-        "fetch": "fetch(" in html_code,
-        "addEventListener": "addEventListener" in html_code,
-    }
+    index = index or DocumentIndex(html_code, "")
     
     # Determine if JS check dependencies are met
     passed = False
     reason = "JS check syntax found"
     
-    for pattern, exists in checks_map.items():
+    for pattern, needles in JS_PATTERNS:
         if pattern in js_expr:
-            passed = exists
-            reason = f"Pattern '{pattern}' {'found' if exists else 'missing'}"
+            passed = any(n in index.html_needles for n in needles)
+            reason = f"Pattern '{pattern}' {'found' if passed else 'missing'}"
             break
     
     # If we didn't match specific patterns, just check if there's JS
-    if not passed and len(html_code) > 100:
+    if not passed and index.html_len > 100:
         passed = True
         reason = "JavaScript code present for runtime validation"
     
@@ -221,15 +287,14 @@ def validate_js_check(check: str, html_code: str) -> dict:
     }
 
 
-def validate_generic_check(check: str, html_code: str, readme: str) -> dict:
+def validate_generic_check(check: str, html_code: str, readme: str, index: DocumentIndex = None) -> dict:
     """Validate generic checks by searching code."""
     
-    combined = (html_code + " " + readme).lower()
-    check_lower = check.lower()
+    index = index or DocumentIndex(html_code, readme)
     
     # Extract key concepts from check
     keywords = extract_keywords(check)
-    found_keywords = sum(1 for kw in keywords if kw in combined)
+    found_keywords = sum(1 for kw in keywords if index.has_keyword(kw))
     
     passed = found_keywords >= max(1, len(keywords) // 2)
     
@@ -246,10 +311,8 @@ def extract_keywords(text: str) -> list:
     """Extract important keywords from check text."""
     
     # Remove common words
-    stop_words = {"the", "a", "an", "and", "or", "is", "are", "be", "to", "for", "of", "in", "on", "with", "at", "by", "from"}
-    
     words = re.findall(r'\b\w+\b', text.lower())
-    keywords = [w for w in words if len(w) > 3 and w not in stop_words]
+    keywords = [w for w in words if len(w) > 3 and w not in STOP_WORDS]
     
     return keywords
 
@@ -0,0 +1,15 @@
+# app/config.py
+import os
+from dotenv import load_dotenv
+
+# The single place .env is loaded. app/__init__ imports this module first, so every
+# module-level os.getenv in the package already sees the .env values.
+load_dotenv()
+
+GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
+GITHUB_USERNAME = os.getenv("GITHUB_USERNAME")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+USER_SECRET = os.getenv("USER_SECRET")
+# Build the LLM and GitHub clients in the background right after startup
+WARM_UP_CLIENTS = os.getenv("WARM_UP_CLIENTS", "true").lower() in ("1", "true", "yes")
@@ -0,0 +1,124 @@
+# app/gen_cache.py
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+GEN_CACHE_PATH = os.getenv("GEN_CACHE_PATH", "/tmp/llm_cache.db")
+GEN_CACHE_TTL = int(os.getenv("GEN_CACHE_TTL", str(7 * 24 * 3600)))
+GEN_CACHE_MAX_ENTRIES = int(os.getenv("GEN_CACHE_MAX_ENTRIES", "500"))
+GEN_CACHE_BYPASS = os.getenv("GEN_CACHE_BYPASS", "").lower() in ("1", "true", "yes")
+
+
+def generation_key(model_name: str, brief: str, checks=None, attachments=None, round_num=1, prev_readme=None,
+                   prev_code=None) -> str:
+    """
+    Content hash of every input that shapes the prompt.
+    model_name namespaces the entry by the provider and model that produced it
+    (ProviderRouter.cache_id), so one provider's output is never served as another's.
+    Attachments contribute their name and content digest: the sha256 recorded by
+    decode_attachments, or a digest of the raw data URI.
+    """
+    att_digests = [
+        (att.get("name"), att.get("sha256") or hashlib.sha256(att.get("url", "").encode("utf-8")).hexdigest())
+        for att in attachments or []
+    ]
+    material = json.dumps(
+        {
+            "model": model_name,
+            "brief": brief,
+            "checks": list(checks or []),
+            "attachments": att_digests,
+            "round": round_num,
+            "prev_readme": prev_readme or "",
+            "prev_code": hashlib.sha256((prev_code or "").encode("utf-8")).hexdigest(),
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class GenerationCache:
+    """
+    Persistent cache of generated files keyed by generation_key().
+    Entries expire after `ttl` seconds and the least recently used ones are
+    evicted once more than `max_entries` are stored.
+    """
+
+    def __init__(self, path: str = GEN_CACHE_PATH, ttl: int = GEN_CACHE_TTL, max_entries: int = GEN_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+            "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT value, created_at FROM generations WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row[1] > self.ttl:
+            self.misses += 1
+            return None
+        conn.execute("UPDATE generations SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, value) -> None:
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "INSERT INTO generations (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+            "created_at = excluded.created_at, accessed_at = excluded.accessed_at",
+            (key, json.dumps(value), now, now),
+        )
+        self.evict(now)
+
+    def evict(self, now: float = None) -> int:
+        """Drop expired entries, then the least recently used beyond max_entries."""
+        now = now or time.time()
+        conn = self._conn()
+        removed = conn.execute(
+            "DELETE FROM generations WHERE created_at < ?", (now - self.ttl,)
+        ).rowcount
+        removed += conn.execute(
+            "DELETE FROM generations WHERE key IN ("
+            "SELECT key FROM generations ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        self.evictions += removed
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._conn().execute("SELECT COUNT(*) FROM generations").fetchone()[0],
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "bypass": GEN_CACHE_BYPASS,
+        }
+
+
+generation_cache = GenerationCache()
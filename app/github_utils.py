@@ -1,47 +1,329 @@
 # app/github_utils.py
 import os
-from github import Github
-from github import GithubException
-import httpx
-from dotenv import load_dotenv
+import time
+import base64
+import hashlib
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from app.config import GITHUB_TOKEN, GITHUB_USERNAME as USERNAME
+from app.http_clients import get_client, get_async_client
+from app.metrics import span
+from app.skeletons import render
 from datetime import datetime
 
-load_dotenv()
+# PyGithub is imported on first use (it adds ~70ms to a cold start); functions that
+# handle its exceptions import them locally.
+# REST API root; point it at a local stand-in to exercise the pipeline offline
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com").rstrip("/")
+# Size of PyGithub's requests connection pool (keep-alive across API calls)
+GITHUB_POOL_SIZE = int(os.getenv("GITHUB_POOL_SIZE", "10"))
+# Parallel uploads per publish; halved on rate-limit responses and regrown on success
+GITHUB_UPLOAD_CONCURRENCY = int(os.getenv("GITHUB_UPLOAD_CONCURRENCY", "4"))
+# Below this many remaining core requests, calls are spread out until the window resets
+GITHUB_MIN_REMAINING = int(os.getenv("GITHUB_MIN_REMAINING", "100"))
+GITHUB_MAX_BACKOFF = float(os.getenv("GITHUB_MAX_BACKOFF", "60"))
+# PyGithub serializes writes with a fixed pause; RateLimitedGitHub adapts on top of a shorter one
+GITHUB_SECONDS_BETWEEN_WRITES = float(os.getenv("GITHUB_SECONDS_BETWEEN_WRITES", "0.2"))
+# Seconds repo objects, branch heads, trees and Pages status are reused before re-fetching
+GITHUB_CACHE_TTL = float(os.getenv("GITHUB_CACHE_TTL", "300"))
+
+_github = None
+_github_lock = threading.Lock()
+
+
+def get_github():
+    """
+    Application-wide PyGithub client, created on first use.
+    """
+    global _github
+    with _github_lock:
+        if _github is None:
+            from github import Github
+            from urllib3.util.retry import Retry
+            _github = Github(
+                GITHUB_TOKEN,
+                base_url=GITHUB_API_URL,
+                pool_size=GITHUB_POOL_SIZE,
+                seconds_between_requests=None,
+                seconds_between_writes=GITHUB_SECONDS_BETWEEN_WRITES or None,
+                # PyGithub's default retry also sleeps through 403/429 rate limits inside urllib3,
+                # hiding them from RateLimitedGitHub; only server errors are retried down there
+                retry=Retry(
+                    total=3,
+                    backoff_factor=1,
+                    status_forcelist=list(range(500, 600)),
+                    allowed_methods=Retry.DEFAULT_ALLOWED_METHODS.union({"GET", "POST"}),
+                    # Otherwise a 429 with Retry-After is retried here as well
+                    respect_retry_after_header=False,
+                    raise_on_status=False,
+                ),
+            )
+    return _github
+
+
+class RateLimitedGitHub:
+    """
+    Runs PyGithub calls with bounded, adaptive parallelism.
+
+    Quota is read from the X-RateLimit-* headers PyGithub records on every
+    response. When the remaining quota runs low, calls are spaced out until the
+    reset. Primary and secondary rate-limit errors honour Retry-After (or the
+    reset time), halve the parallelism and retry. Parallelism grows back one
+    step per run of successful calls.
+    """
+
+    def __init__(self, client_factory, max_parallel: int = GITHUB_UPLOAD_CONCURRENCY, max_attempts: int = 4):
+        self.client_factory = client_factory
+        self._client = None
+        self.max_parallel = max(1, max_parallel)
+        self.parallel = self.max_parallel
+        self.max_attempts = max_attempts
+        self._cond = threading.Condition()
+        self._active = 0
+        self._streak = 0
+        self.calls = 0
+        self.throttled = 0
+        self.rate_limited = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self.client_factory()
+        return self._client
+
+    def quota(self):
+        """(remaining, limit, reset epoch) from the last response; limit is -1 before any call."""
+        requester = getattr(self._client, "_Github__requester", None)
+        if requester is None:
+            return -1, -1, 0
+        remaining, limit = requester.rate_limiting
+        return remaining, limit, requester.rate_limiting_resettime
+
+    def _acquire(self):
+        with self._cond:
+            while self._active >= self.parallel:
+                self._cond.wait()
+            self._active += 1
+
+    def _release(self):
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def _pace(self):
+        remaining, limit, reset = self.quota()
+        if limit < 0 or remaining >= GITHUB_MIN_REMAINING:
+            return
+        # Spread the remaining calls evenly over what is left of the window
+        wait = min(max(reset - time.time(), 0) / max(remaining, 1), GITHUB_MAX_BACKOFF)
+        if wait > 0:
+            self.throttled += 1
+            print(f"🐢 GitHub quota low ({remaining}/{limit}), pausing {wait:.1f}s")
+            time.sleep(wait)
+
+    def _retry_after(self, e) -> float:
+        headers = {k.lower(): v for k, v in (e.headers or {}).items()}
+        if "retry-after" in headers:
+            return min(float(headers["retry-after"]), GITHUB_MAX_BACKOFF)
+        if headers.get("x-ratelimit-remaining") == "0" and "x-ratelimit-reset" in headers:
+            return min(max(float(headers["x-ratelimit-reset"]) - time.time(), 1.0), GITHUB_MAX_BACKOFF)
+        # GitHub asks for at least a minute after a secondary limit without Retry-After
+        return GITHUB_MAX_BACKOFF
+
+    @staticmethod
+    def _is_rate_limit(e) -> bool:
+        from github import RateLimitExceededException
+        if isinstance(e, RateLimitExceededException):
+            return True
+        return e.status in (403, 429) and "rate limit" in str(e.data).lower()
+
+    def call(self, fn, *args, **kwargs):
+        from github import GithubException
+        for attempt in range(self.max_attempts):
+            self._pace()
+            self._acquire()
+            try:
+                self.calls += 1
+                result = fn(*args, **kwargs)
+            except GithubException as e:
+                if not self._is_rate_limit(e) or attempt == self.max_attempts - 1:
+                    raise
+                self.rate_limited += 1
+                with self._cond:
+                    self.parallel = max(1, self.parallel // 2)
+                    self._streak = 0
+                delay = self._retry_after(e)
+                print(f"🚧 GitHub rate limit hit (HTTP {e.status}), retrying in {delay:.0f}s with parallelism {self.parallel}")
+            else:
+                with self._cond:
+                    self._streak += 1
+                    if self.parallel < self.max_parallel and self._streak >= 10:
+                        self.parallel += 1
+                        self._streak = 0
+                        self._cond.notify_all()
+                return result
+            finally:
+                self._release()
+            time.sleep(delay)
+
+    def map(self, fn, items):
+        """Apply fn to every item concurrently (bounded by the current parallelism), keeping order."""
+        items = list(items)
+        if len(items) <= 1:
+            return [self.call(fn, item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel, len(items))) as pool:
+            # Each worker runs in a copy of the caller's context so spans reach the task trace
+            futures = [pool.submit(contextvars.copy_context().run, self.call, fn, item) for item in items]
+            return [f.result() for f in futures]
+
+    def stats(self) -> dict:
+        remaining, limit, reset = self.quota()
+        return {
+            "rate_remaining": remaining,
+            "rate_limit": limit,
+            "rate_reset_in": max(int(reset - time.time()), 0) if reset else None,
+            "parallel": self.parallel,
+            "max_parallel": self.max_parallel,
+            "active": self._active,
+            "calls": self.calls,
+            "throttled": self.throttled,
+            "rate_limited": self.rate_limited,
+        }
+
+
+github_client = RateLimitedGitHub(get_github)
+
+
+class MetadataCache:
+    """
+    Thread-safe TTL cache for GitHub metadata (user, repos, branch heads, trees, Pages status).
+
+    Keys are tuples whose first items name the kind and repo, e.g. ("head", "owner/repo", "main"),
+    so everything cached for a repo can be dropped with invalidate(kind, repo). Writers
+    update or invalidate the entries they affect instead of waiting for the TTL.
+    """
+
+    def __init__(self, ttl: float = GITHUB_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, value, ttl: float = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + (self.ttl if ttl is None else ttl), value)
+
+    def get_or_load(self, key: tuple, loader, ttl: float = None):
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            self.put(key, value, ttl)
+        return value
+
+    def invalidate(self, *prefix) -> int:
+        """Drop every entry whose key starts with `prefix` (everything when empty)."""
+        with self._lock:
+            doomed = [k for k in self._entries if k[:len(prefix)] == prefix]
+            for key in doomed:
+                del self._entries[key]
+            self.invalidations += len(doomed)
+            return len(doomed)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "ttl": self.ttl,
+        }
+
+
+metadata_cache = MetadataCache()
+
+
+def _get_user():
+    # The authenticated identity never changes for a token
+    return metadata_cache.get_or_load(("user",), lambda: github_client.call(github_client.client.get_user), ttl=24 * 3600)
 
-GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
-USERNAME = os.getenv("GITHUB_USERNAME")
-g = Github(GITHUB_TOKEN)
 
 def create_repo(repo_name: str, description: str = ""):
     """
     Create a public repository with the given name.
     """
-    user = g.get_user()
+    from github import GithubException
+    repo = metadata_cache.get(("repo", repo_name))
+    if repo is not None:
+        return repo
+    user = _get_user()
     # if repo exists, return it
     try:
-        repo = user.get_repo(repo_name)
+        repo = github_client.call(user.get_repo, repo_name)
         print("Repo already exists:", repo.full_name)
+        metadata_cache.put(("repo", repo_name), repo)
         return repo
     except GithubException:
         pass
 
-    repo = user.create_repo(
+    repo = github_client.call(
+        user.create_repo,
         name=repo_name,
         description=description,
         private=False,
         auto_init=False
     )
     print("Created repo:", repo.full_name)
+    metadata_cache.put(("repo", repo_name), repo)
     return repo
 
+def git_blob_sha(data: bytes) -> str:
+    """
+    SHA git assigns to a blob with this content, as listed in remote trees.
+    """
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _content_bytes(content) -> bytes:
+    if isinstance(content, Base64Blob):
+        return base64.b64decode(content.data)
+    if isinstance(content, str):
+        return content.encode("utf-8")
+    return content
+
+
+def _content_sha(content) -> str:
+    # Attachments carry the SHA computed while they were decoded, so they are not decoded again here
+    if isinstance(content, Base64Blob) and content.git_sha:
+        return content.git_sha
+    return git_blob_sha(_content_bytes(content))
+
+
 def create_or_update_file(repo, path: str, content: str, message: str):
     """
     Create a file or update if it already exists.
     """
+    from github import GithubException
     try:
         # Try to get file to see if exists
         current = repo.get_contents(path)
         sha = current.sha
+        if sha == git_blob_sha(content.encode("utf-8")):
+            print(f"Unchanged {path} in {repo.full_name}, skipping")
+            return
         repo.update_file(path, message, content, sha)
         print(f"Updated {path} in {repo.full_name}")
     except GithubException as e:
@@ -59,10 +341,14 @@ def create_or_update_binary_file(repo, path: str, binary_content, commit_message
     Create or update a binary file in the repository.
     This function handles binary data like images directly without encoding/decoding.
     """
+    from github import GithubException
     try:
         # Try to get file to see if exists
         try:
             current = repo.get_contents(path)
+            if current.sha == git_blob_sha(binary_content):
+                print(f"Unchanged binary file {path} in {repo.full_name}, skipping")
+                return True
             # Update existing file
             repo.update_file(
                 path=path,
@@ -88,22 +374,230 @@ def create_or_update_binary_file(repo, path: str, binary_content, commit_message
         print(f"Error creating/updating binary file {path}: {e}")
         return False
 
+publish_stats = {"publishes": 0, "commits": 0, "noop_publishes": 0, "files_written": 0, "files_skipped": 0}
+
+
+def get_publish_stats() -> dict:
+    return dict(publish_stats)
+
+
+class Base64Blob:
+    """
+    Binary file content that is already base64-encoded; publish_files commits it as-is.
+    `git_sha` is the git blob SHA of the decoded content, if already known.
+    """
+    __slots__ = ("data", "git_sha")
+
+    def __init__(self, data: str, git_sha: str = None):
+        self.data = data
+        self.git_sha = git_sha
+
+
+def _get_branch_head(repo, branch: str):
+    """
+    Return (ref, commit) for the branch head, or (None, None) if the repo is still empty.
+    """
+    from github import GithubException
+    cached = metadata_cache.get(("head", repo.full_name, branch))
+    if cached is not None:
+        return cached
+    try:
+        ref = github_client.call(repo.get_git_ref, f"heads/{branch}")
+        head = ref, github_client.call(repo.get_git_commit, ref.object.sha)
+        metadata_cache.put(("head", repo.full_name, branch), head)
+        return head
+    except GithubException as e:
+        # 409 "Git Repository is empty", 404 branch not created yet
+        if e.status in (404, 409):
+            return None, None
+        raise
+
+
+def remote_tree(repo, head) -> dict:
+    """
+    {path: blob sha} of every file in the head commit, fetched in one recursive tree call.
+    Trees are immutable, so they are cached by tree SHA.
+    """
+    def load():
+        with span("github_tree_fetch"):
+            tree = github_client.call(repo.get_git_tree, head.tree.sha, recursive=True)
+        return {el.path: el.sha for el in tree.tree if el.type == "blob"}
+
+    return metadata_cache.get_or_load(("tree", repo.full_name, head.tree.sha), load)
+
+
+def read_files(repo, paths, branch: str = "main") -> dict:
+    """
+    {path: text} for those of `paths` present on the branch head. Blobs are looked up
+    through the cached tree and cached by SHA, so unchanged files are fetched once.
+    """
+    ref, head = _get_branch_head(repo, branch)
+    if ref is None:
+        return {}
+    tree = remote_tree(repo, head)
+    files = {}
+    for path in paths:
+        sha = tree.get(path)
+        if sha is None:
+            continue
+
+        def load(sha=sha):
+            with span("github_blob_fetch", path=path):
+                blob = github_client.call(repo.get_git_blob, sha)
+            return base64.b64decode(blob.content) if blob.encoding == "base64" else blob.content.encode("utf-8")
+
+        files[path] = metadata_cache.get_or_load(("blob", repo.full_name, sha), load).decode("utf-8", errors="ignore")
+    return files
+
+
+def ensure_initialized(repo, path: str, content: str, message: str, branch: str = "main") -> bool:
+    """
+    Make sure the branch exists by committing `path` through the contents API if the repo is empty.
+    Returns True if a seed commit was made.
+    """
+    ref, _ = _get_branch_head(repo, branch)
+    if ref is not None:
+        return False
+    github_client.call(repo.create_file, path, message, content, branch=branch)
+    metadata_cache.invalidate("head", repo.full_name)
+    print(f"Initialized {repo.full_name} with {path}")
+    return True
+
+
+def publish_files(repo, files: dict, message: str, branch: str = "main", _retry: bool = False):
+    """
+    Commit all files in a single commit using the Git Data API and fast-forward the branch.
+
+    Args:
+        repo: PyGithub Repository
+        files: {path: content}; str is committed as UTF-8 text, bytes or Base64Blob as a binary blob
+        message: Commit message
+        branch: Branch to update
+
+    Files whose git blob SHA already matches the remote tree are left out, and
+    when nothing changed no commit is made at all.
+
+    Returns:
+        {"commit_sha", "written", "skipped"}; commit_sha is the existing head when nothing changed.
+    """
+    from github import GithubException, InputGitTreeElement
+    ref, head = _get_branch_head(repo, branch)
+    if ref is None:
+        # The Git Data API rejects empty repos, so seed the branch through the contents API first
+        seed_path = next((p for p, c in files.items() if isinstance(c, str)), ".gitkeep")
+        ensure_initialized(repo, seed_path, files.get(seed_path, ""), message, branch)
+        ref, head = _get_branch_head(repo, branch)
+
+    existing = remote_tree(repo, head)
+    changed = {p: c for p, c in files.items() if existing.get(p) != _content_sha(c)}
+    skipped = len(files) - len(changed)
+    publish_stats["publishes"] += 1
+    publish_stats["files_written"] += len(changed)
+    publish_stats["files_skipped"] += skipped
+    if not changed:
+        publish_stats["noop_publishes"] += 1
+        print(f"All {len(files)} files unchanged in {repo.full_name}@{branch}, no commit needed")
+        return {"commit_sha": head.sha, "written": 0, "skipped": skipped}
+    requested, files = files, changed
+
+    def upload_blob(item):
+        path, content = item
+        b64 = content.data if isinstance(content, Base64Blob) else base64.b64encode(content).decode("ascii")
+        with span("github_blob", path=path):
+            return path, repo.create_git_blob(b64, "base64").sha
+
+    # Binary blobs are independent uploads, so they go out in parallel
+    binaries = [(p, c) for p, c in files.items() if isinstance(c, (bytes, Base64Blob))]
+    blob_shas = dict(github_client.map(upload_blob, binaries))
+
+    elements = []
+    for path, content in files.items():
+        if path in blob_shas:
+            elements.append(InputGitTreeElement(path, "100644", "blob", sha=blob_shas[path]))
+        else:
+            # Text content is inlined in the tree request, no separate blob call needed
+            elements.append(InputGitTreeElement(path, "100644", "blob", content=content))
+
+    with span("github_tree", files=len(elements)):
+        tree = github_client.call(repo.create_git_tree, elements, base_tree=head.tree)
+    with span("github_commit"):
+        commit = github_client.call(repo.create_git_commit, message, tree, [head])
+    with span("github_ref_update"):
+        try:
+            github_client.call(ref.edit, commit.sha)
+        except GithubException as e:
+            # 422: the branch moved since the head was cached; retry once on the fresh head
+            metadata_cache.invalidate("head", repo.full_name)
+            if e.status != 422 or _retry:
+                raise
+            return publish_files(repo, requested, message, branch, _retry=True)
+
+    # Write-through: the new head and its tree are known without asking GitHub again
+    metadata_cache.put(("head", repo.full_name, branch), (ref, commit))
+    new_tree = dict(existing)
+    new_tree.update({p: blob_shas.get(p) or _content_sha(c) for p, c in files.items()})
+    metadata_cache.put(("tree", repo.full_name, tree.sha), new_tree)
+    publish_stats["commits"] += 1
+    print(f"Committed {len(elements)} files to {repo.full_name}@{branch} ({commit.sha[:7]}), {skipped} unchanged")
+    return {"commit_sha": commit.sha, "written": len(elements), "skipped": skipped}
+
+def pages_api_url(repo_name: str) -> str:
+    return f"{GITHUB_API_URL}/repos/{USERNAME}/{repo_name}/pages"
+
+def api_headers() -> dict:
+    return {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
+
+def _pages_request(repo_name: str, branch: str):
+    data = {"source": {"branch": branch, "path": "/"}}
+    return pages_api_url(repo_name), api_headers(), data
+
+def _pages_result(repo_name: str, r) -> bool:
+    if r.status_code in (201, 204):
+        print("✅ Pages enabled for", repo_name)
+        metadata_cache.put(("pages", repo_name), True)
+        return True
+    # GitHub sometimes returns 202 while building; treat 202 as success to allow polling
+    print("Pages API returned:", r.status_code, r.text)
+    return False
+
+def _pages_already_enabled(repo_name: str, r) -> bool:
+    # GET .../pages is 200 once a Pages site exists, 404 before
+    if r.status_code == 200:
+        print("✅ Pages already enabled for", repo_name)
+        metadata_cache.put(("pages", repo_name), True)
+        return True
+    return False
+
 def enable_pages(repo_name: str, branch: str = "main"):
     """
     Enable GitHub Pages via REST API; expects GITHUB_USERNAME in env.
+    Sites that are already enabled (cached or reported by GitHub) are not re-POSTed.
     """
-    url = f"https://api.github.com/repos/{USERNAME}/{repo_name}/pages"
-    headers = {"Authorization": f"token {GITHUB_TOKEN}", "Accept": "application/vnd.github.v3+json"}
-    data = {"source": {"branch": branch, "path": "/"}}
+    if metadata_cache.get(("pages", repo_name)):
+        return True
+    url, headers, data = _pages_request(repo_name, branch)
     try:
-        r = httpx.post(url, headers=headers, json=data, timeout=30.0)
-        if r.status_code in (201, 204):
-            print("✅ Pages enabled for", repo_name)
+        if _pages_already_enabled(repo_name, get_client().get(url, headers=headers, timeout=30.0)):
             return True
-        else:
-            # GitHub sometimes returns 202 while building; treat 202 as success to allow polling
-            print("Pages API returned:", r.status_code, r.text)
-            return False
+        r = get_client().post(url, headers=headers, json=data, timeout=30.0)
+        return _pages_result(repo_name, r)
+    except Exception as e:
+        print("Failed to call Pages API:", e)
+        return False
+
+async def enable_pages_async(repo_name: str, branch: str = "main"):
+    """
+    Async variant of enable_pages.
+    """
+    if metadata_cache.get(("pages", repo_name)):
+        return True
+    url, headers, data = _pages_request(repo_name, branch)
+    try:
+        r = await get_async_client().get(url, headers=headers, timeout=30.0)
+        if _pages_already_enabled(repo_name, r):
+            return True
+        r = await get_async_client().post(url, headers=headers, json=data, timeout=30.0)
+        return _pages_result(repo_name, r)
     except Exception as e:
         print("Failed to call Pages API:", e)
         return False
@@ -111,10 +605,4 @@ def enable_pages(repo_name: str, branch: str = "main"):
 def generate_mit_license(owner_name=None):
     year = datetime.utcnow().year
     owner = owner_name or USERNAME or "Owner"
-    return f"""MIT License
-
-Copyright (c) {year} {owner}
-
-Permission is hereby granted, free of charge, to any person obtaining a copy...
-[Full MIT license text omitted here for brevity — replace in production with full license text]
-"""
+    return render("license_mit", year=year, owner=owner)
@@ -0,0 +1,117 @@
+# app/http_clients.py
+import os
+import httpx
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+HTTP2 = HTTP2_AVAILABLE and os.getenv("HTTP2", "true").lower() in ("1", "true", "yes")
+
+_client = None
+_async_client = None
+request_stats = {"requests": 0, "responses": 0}
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def _count_request(request):
+    request_stats["requests"] += 1
+
+
+def _count_response(response):
+    request_stats["responses"] += 1
+
+
+async def _acount_request(request):
+    request_stats["requests"] += 1
+
+
+async def _acount_response(response):
+    request_stats["responses"] += 1
+
+
+def get_client() -> httpx.Client:
+    """
+    Application-wide pooled sync client; connections are kept alive across calls.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.Client(
+            http2=HTTP2,
+            limits=_limits(),
+            timeout=_timeout(),
+            event_hooks={"request": [_count_request], "response": [_count_response]},
+        )
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Application-wide pooled async client, created on first use inside the event loop.
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            http2=HTTP2,
+            limits=_limits(),
+            timeout=_timeout(),
+            event_hooks={"request": [_acount_request], "response": [_acount_response]},
+        )
+    return _async_client
+
+
+def close_clients():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def aclose_clients():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+    close_clients()
+
+
+def _pool_usage(client) -> dict:
+    # httpcore keeps the live connections on the transport's pool
+    pool = getattr(getattr(client, "_transport", None), "_pool", None) if client else None
+    connections = list(getattr(pool, "connections", []) or [])
+    idle = sum(1 for c in connections if c.is_idle())
+    return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+
+def pool_stats() -> dict:
+    sync_usage = _pool_usage(_client)
+    async_usage = _pool_usage(_async_client)
+    return {
+        "http2": HTTP2,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+        "max_keepalive": HTTP_MAX_KEEPALIVE,
+        "sync": sync_usage,
+        "async": async_usage,
+        "requests": request_stats["requests"],
+        "responses": request_stats["responses"],
+        "utilization": round((sync_usage["active"] + async_usage["active"]) / HTTP_MAX_CONNECTIONS, 3),
+    }
@@ -0,0 +1,155 @@
+# app/jobs.py
+import os
+import time
+import asyncio
+
+from app.metrics import observe
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "50"))
+# Seconds a client is asked to wait before retrying when the queue is full
+QUEUE_RETRY_AFTER = int(os.getenv("QUEUE_RETRY_AFTER", "30"))
+
+# Per-stage concurrency limits, shared by all workers
+STAGE_LIMITS = {
+    "llm": int(os.getenv("LLM_CONCURRENCY", "2")),
+    "github": int(os.getenv("GITHUB_CONCURRENCY", "4")),
+    "notify": int(os.getenv("NOTIFY_CONCURRENCY", "8")),
+}
+
+_stage_semaphores = {name: asyncio.Semaphore(limit) for name, limit in STAGE_LIMITS.items()}
+_stage_active = {name: 0 for name in STAGE_LIMITS}
+
+
+class _StageSlot:
+    def __init__(self, name: str):
+        self.name = name
+        self.semaphore = _stage_semaphores[name]
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+        _stage_active[self.name] += 1
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        _stage_active[self.name] -= 1
+        self.semaphore.release()
+        return False
+
+
+def stage_limit(name: str) -> _StageSlot:
+    """
+    Async context manager that holds one slot of the named stage ("llm", "github", "notify").
+    """
+    return _StageSlot(name)
+
+
+class JobQueue:
+    """
+    Bounded in-process job queue drained by a fixed pool of asyncio workers.
+    Jobs submitted with a key are tracked until they finish, so duplicate
+    submissions can attach to the running job instead of starting another.
+    """
+
+    def __init__(self, handler, workers: int = JOB_WORKERS, maxsize: int = JOB_QUEUE_SIZE):
+        self.handler = handler
+        self.workers = workers
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self._tasks = []
+        self.running = 0
+        self.accepted = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+        self.coalesced = 0
+        self.inflight = {}
+        self._job_seconds = 0.0
+
+    async def start(self):
+        for i in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        print(f"🧵 Job queue started with {self.workers} workers (max depth {self.queue.maxsize})")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, job, key: str = None):
+        """
+        Enqueue a job without waiting. Returns a future resolving to the handler's
+        result, or None when the queue is full.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Nobody has to await the result; don't warn about unretrieved exceptions
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        try:
+            self.queue.put_nowait((time.time(), job, key, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return None
+        self.accepted += 1
+        if key is not None:
+            self.inflight[key] = future
+        return future
+
+    def attach(self, key: str):
+        """
+        Return the future of the queued or running job with this key, or None.
+        """
+        future = self.inflight.get(key)
+        if future is None or future.done():
+            return None
+        self.coalesced += 1
+        return future
+
+    async def _worker(self, worker_id: int):
+        while True:
+            enqueued_at, job, key, future = await self.queue.get()
+            self.running += 1
+            started = time.time()
+            observe("queue_wait", started - enqueued_at)
+            try:
+                print(f"🧵 Worker {worker_id} picked up job after {started - enqueued_at:.1f}s in queue")
+                result = await self.handler(job)
+                observe("job_total", time.time() - started)
+                self.completed += 1
+                self._job_seconds += time.time() - started
+                if not future.done():
+                    future.set_result(result)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except Exception as e:
+                self.failed += 1
+                print(f"❌ Job failed in worker {worker_id}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+            finally:
+                self.running -= 1
+                if key is not None and self.inflight.get(key) is future:
+                    del self.inflight[key]
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        avg_job_seconds = self._job_seconds / self.completed if self.completed else 0.0
+        return {
+            "queue_depth": self.queue.qsize(),
+            "queue_capacity": self.queue.maxsize,
+            "workers": self.workers,
+            "running": self.running,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "completed": self.completed,
+            "failed": self.failed,
+            "in_flight_keys": len(self.inflight),
+            "coalesced": self.coalesced,
+            # Each coalesced duplicate skipped a full pipeline run (LLM call, commit, notify)
+            "estimated_seconds_saved": round(self.coalesced * avg_job_seconds, 1),
+            "avg_job_seconds": round(avg_job_seconds, 1),
+            "stages": {
+                name: {"active": _stage_active[name], "limit": STAGE_LIMITS[name]}
+                for name in STAGE_LIMITS
+            },
+        }
@@ -0,0 +1,114 @@
+# app/journal.py
+import os
+import time
+
+# A job restarted this many times without finishing is dropped instead of resumed
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+# Pipeline stages in order, each recorded once its work is durable. Queuing the
+# notification is the last step; the job is then removed from the journal.
+STAGES = ("generated", "validated", "committed", "pages")
+
+
+class JobJournal:
+    """
+    Write-ahead journal of background jobs, kept in key/value stores (see app/store.py).
+
+    A job's request is recorded in `store` when it is accepted and every stage is recorded
+    with its artifacts (files, validation, commit SHA, Pages URL) in `stage_store` as soon
+    as it completes, under "<job key>::<stage>", so recording a stage never rewrites the
+    request or the earlier stages. After a restart, incomplete() lists the jobs to
+    resubmit, and the pipeline skips the stages already in the journal instead of redoing
+    them. Finished jobs are removed, and on_remove(key, request data) is then called so
+    resources kept for a resume (e.g. the job's attachment view) can be released.
+    """
+
+    def __init__(self, store, stage_store, max_attempts: int = JOB_MAX_ATTEMPTS, on_remove=None):
+        self.store = store
+        self.stage_store = stage_store
+        self.on_remove = on_remove
+        self.max_attempts = max_attempts
+        self.resumed = 0
+        self.abandoned = 0
+        self.finished = 0
+        self.stages_skipped = 0
+
+    def add(self, key: str, data: dict) -> dict:
+        """
+        Record an accepted job, unless it is already journaled, and return its entry.
+        Attachments should already be object-store references (see attachment_refs in
+        app/attachment_store.py) rather than data URIs.
+        """
+        entry = self.store.get(key)
+        if entry is None:
+            # The secret is checked on receipt and never needed again
+            data = {k: v for k, v in data.items() if k != "secret"}
+            entry = {"data": data, "attempts": 0, "created_at": time.time()}
+            self.store.put(key, entry)
+        return entry
+
+    def begin(self, key: str, data: dict) -> dict:
+        """
+        Record that `key` is starting (again) and return its completed stages.
+        """
+        entry = self.add(key, data)
+        stages = {}
+        for stage in STAGES:
+            artifacts = self.stage_store.get(f"{key}::{stage}")
+            if artifacts is not None:
+                stages[stage] = artifacts
+        if stages:
+            self.stages_skipped += len(stages)
+            print(f"📒 Resuming {key} after {', '.join(stages)}")
+        entry["attempts"] += 1
+        entry["updated_at"] = time.time()
+        self.store.put(key, entry)
+        return stages
+
+    def record(self, key: str, stage: str, artifacts: dict = None) -> None:
+        if key not in self.store:
+            return
+        self.stage_store.put(f"{key}::{stage}", artifacts or {})
+
+    def _delete(self, key: str, entry: dict) -> None:
+        for stage in STAGES:
+            self.stage_store.delete(f"{key}::{stage}")
+        self.store.delete(key)
+        if self.on_remove is not None:
+            self.on_remove(key, entry["data"])
+
+    def finish(self, key: str) -> None:
+        entry = self.store.get(key)
+        if entry is not None:
+            self._delete(key, entry)
+            self.finished += 1
+
+    def discard(self, key: str) -> None:
+        """Remove a job that was journaled but never queued."""
+        entry = self.store.get(key)
+        if entry is not None:
+            self._delete(key, entry)
+
+    def incomplete(self) -> list:
+        """
+        (key, request data) of every unfinished job still worth resuming, oldest first.
+        Jobs that already used up their attempts are removed.
+        """
+        jobs = []
+        for key, entry in sorted(self.store.items(), key=lambda item: item[1].get("created_at", 0)):
+            if entry["attempts"] >= self.max_attempts:
+                print(f"🗑 Dropping {key} after {entry['attempts']} attempts")
+                self._delete(key, entry)
+                self.abandoned += 1
+                continue
+            jobs.append((key, entry["data"]))
+        return jobs
+
+    def stats(self) -> dict:
+        return {
+            "open": len(self.store),
+            "resumed": self.resumed,
+            "abandoned": self.abandoned,
+            "finished": self.finished,
+            "stages_skipped": self.stages_skipped,
+        }
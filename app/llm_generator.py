@@ -182,56 +182,41 @@
 
 
 import os
-import base64
+import time
+import asyncio
+import functools
 import mimetypes
-from pathlib import Path
+from html import escape as html_escape
 from datetime import datetime
-from dotenv import load_dotenv
-
-load_dotenv()
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-
-# Import and configure Gemini
-try:
-    import google.generativeai as genai
-    genai.configure(api_key=GEMINI_API_KEY)
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    print("✅ Gemini API configured successfully")
-except Exception as e:
-    print(f"⚠️ Gemini import error: {e}")
-    model = None
-
-TMP_DIR = Path("/tmp/llm_attachments")
-TMP_DIR.mkdir(parents=True, exist_ok=True)
-
-def decode_attachments(attachments):
-    """
-    attachments: list of {name, url: data:<mime>;base64,<b64>}
-    Saves files into /tmp/llm_attachments/<name>
-    Returns list of dicts: {"name": name, "path": "/tmp/..", "mime": mime, "size": n}
-    """
-    saved = []
-    for att in attachments or []:
-        name = att.get("name") or "attachment"
-        url = att.get("url", "")
-        if not url.startswith("data:"):
-            continue
-        try:
-            header, b64data = url.split(",", 1)
-            mime = header.split(";")[0].replace("data:", "")
-            data = base64.b64decode(b64data)
-            path = TMP_DIR / name
-            with open(path, "wb") as f:
-                f.write(data)
-            saved.append({
-                "name": name,
-                "path": str(path),
-                "mime": mime,
-                "size": len(data)
-            })
-        except Exception as e:
-            print("Failed to decode attachment", name, e)
-    return saved
+from app.gen_cache import generation_cache, generation_key, GEN_CACHE_BYPASS
+from app.attachment_store import decode_attachments
+from app.metrics import span
+from app.checks_validator import validate_checks
+from app.llm_providers import llm_router
+from app.skeletons import render, render_cached
+from app.patches import PatchError, parse_edits, apply_edits, changed_paths
+from app.prompt_budget import (
+    PROMPT_TOKEN_BUDGET,
+    estimate_tokens,
+    code_digest,
+    markdown_outline,
+    fit_sections,
+)
+
+# Consume Gemini's response stream in the async pipeline
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+README_DELIMITER = "---README.md---"
+# Candidates generated concurrently and scored against the checks; 1 disables the mode
+GEN_CANDIDATES = int(os.getenv("GEN_CANDIDATES", "1"))
+# Validation score (0-100) at which a candidate is accepted without repairs
+GEN_SCORE_THRESHOLD = int(os.getenv("GEN_SCORE_THRESHOLD", "100"))
+# Wall-clock seconds for candidates plus repairs, always capped by the task deadline
+GEN_BUDGET_SECONDS = float(os.getenv("GEN_BUDGET_SECONDS", "240"))
+GEN_REPAIR_ROUNDS = int(os.getenv("GEN_REPAIR_ROUNDS", "2"))
+# Seconds kept free before the task deadline for committing, Pages and notification
+GEN_DEADLINE_RESERVE = float(os.getenv("GEN_DEADLINE_RESERVE", "180"))
+# Round 2 asks for edit blocks against the published files instead of a full rewrite
+GEN_INCREMENTAL = os.getenv("GEN_INCREMENTAL", "true").lower() in ("1", "true", "yes")
 
 def summarize_attachment_meta(saved):
     """
@@ -282,284 +267,655 @@ def generate_professional_readme(brief: str, round_num: int = 1, prev_readme: st
         code_snippet: Generated code (first 500 chars for reference)
     """
     
+    improvements = ""
     if round_num == 2 and prev_readme:
-        improvements = f"""
-## Updates in Round 2
-
-This version builds on the previous iteration with the following improvements:
-- Enhanced UI/UX based on feedback
-- Improved performance and code organization
-- Additional features and refinements
-- Better error handling and edge cases
-
-**Previous version README:**
-```
-{prev_readme[:300]}...
-```
-"""
-    else:
-        improvements = ""
-
-    readme = f"""# {brief.split()[0].upper()} App - Auto-Generated
+        improvements = render("readme_round2_updates", prev_readme=prev_readme[:300])
+    title = (brief.split() or ["Web"])[0].upper()
+    readme = render_cached("readme_professional", brief, round_num, title=title, improvements=improvements)
+    return readme.strip()
 
-## Overview
+def generate_readme_fallback(brief: str, checks=None, attachments_meta=None, round_num=1):
+    """
+    README used when the model returned no README part, or no output at all.
+    """
+    return render_cached(
+        "readme_fallback", brief, round_num,
+        attachments=attachments_meta or "", checks="\n".join(checks or []),
+    )
 
-This is an auto-generated single-page application built with HTML, CSS, and JavaScript.
+def build_prompt(brief: str, attachments_meta: str, checks=None, round_num=1, prev_readme=None, prev_code=None,
+                 budget=PROMPT_TOKEN_BUDGET):
+    """
+    Build the user prompt sent to the model.
+    """
+    return build_prompt_with_report(brief, attachments_meta, checks, round_num, prev_readme, prev_code, budget)[0]
 
-**Brief:** {brief}
+def build_prompt_with_report(brief: str, attachments_meta: str, checks=None, round_num=1, prev_readme=None,
+                             prev_code=None, budget=PROMPT_TOKEN_BUDGET):
+    """
+    build_prompt plus a size report. The brief, checks and output rules are always
+    included; the room left in `budget` goes to, in order, a structural digest of the
+    previous index.html, the attachment summary and the previous README (whole, then
+    as an outline, then truncated).
+    """
+    def render(code_digest_text="", attachments_text="", readme_text=""):
+        context_note = ""
+        if round_num == 2 and (readme_text or code_digest_text):
+            if code_digest_text:
+                context_note += f"\n### Previous index.html (structure):\n{code_digest_text}\n"
+            if readme_text:
+                context_note += f"\n### Previous README.md:\n{readme_text}\n"
+            context_note += "\nRevise and enhance this project according to the new brief below.\n"
+
+        return f"""
+You are a professional web developer assistant.
 
-**Generated:** Round {round_num}
+### Round
+{round_num}
 
-{improvements}
+### Task
+{brief}
 
-## Features
+{context_note}
 
-- Clean, responsive user interface
-- Interactive functionality
-- No build steps required
-- Runs entirely in the browser
+### Attachments (if any)
+{attachments_text}
 
-## Setup
+### Evaluation checks
+{checks or []}
 
-### Prerequisites
-- A modern web browser (Chrome, Firefox, Safari, Edge)
-- No additional dependencies or build tools needed
+### Output format rules:
+1. Produce a complete web app (HTML/JS/CSS inline if needed) satisfying the brief.
+2. Output must contain **two parts only**:
+   - index.html (main code)
+   - README.md (starts after a line containing exactly: ---README.md---)
+3. README.md must include:
+   - Overview
+   - Setup
+   - Usage
+   - If Round 2, describe improvements made from previous version.
+4. Do not include any commentary outside code or README.
+"""
 
-### Installation
+    sections = [("attachments", [attachments_meta], 1.0)]
+    if round_num == 2:
+        sections = [
+            ("prev_code", [code_digest(prev_code)], 0.3),
+            ("attachments", [attachments_meta], 0.5),
+            ("prev_readme", [prev_readme, markdown_outline(prev_readme)], 1.0),
+        ]
+    # Render with stand-ins so the section headings count towards the fixed part
+    chosen, report = fit_sections(estimate_tokens(render(" ", " ", " ")), sections, budget)
+    prompt = render(chosen.get("prev_code", ""), chosen["attachments"], chosen.get("prev_readme", ""))
+    report["prompt_tokens"] = estimate_tokens(prompt)
+    note = f", shortened: {', '.join(report['truncated'] + report['dropped'])}" if report["truncated"] or report["dropped"] else ""
+    print(f"🧮 Prompt size ~{report['prompt_tokens']} tokens (budget {budget}){note}")
+    return prompt, report
+
+def build_repair_prompt(brief: str, files: dict, failed: list) -> str:
+    """
+    Prompt asking the model to fix the checks a previous attempt failed, keeping everything else.
+    """
+    failures = "\n".join(f"- {r['check']}: {r.get('reason', 'failed')}" for r in failed)
+    return f"""
+You are a professional web developer assistant.
 
-1. Clone this repository:
-```bash
-git clone https://github.com/[YOUR-USERNAME]/[REPO-NAME].git
-cd [REPO-NAME]
-```
+The web app below was generated for this task:
+{brief}
 
-2. Open `index.html` in your browser:
-```bash
-# Option 1: Direct file open
-open index.html
+It fails these evaluation checks:
+{failures}
 
-# Option 2: Using Python
-python -m http.server 8000
-# Then visit http://localhost:8000
+Fix the app so every check passes, changing as little else as possible.
 
-# Option 3: Using Node.js
-npx http-server
-# Then visit http://localhost:8080
+### Current index.html
+```html
+{files.get("index.html", "")}
 ```
 
-3. Or visit the live version: [See GitHub Pages URL]
-
-## Usage
+### Current README.md
+{files.get("README.md", "")}
 
-1. Open `index.html` in your web browser
-2. Interact with the interface following the on-screen instructions
-3. All data is stored locally (no backend required)
-4. Works offline once loaded
-
-### Key Features & How to Use Them
-- **Interactive Elements**: Click buttons, fill forms, and interact with the app
-- **Responsive Design**: Works on desktop, tablet, and mobile devices
-- **Real-time Updates**: Changes appear instantly as you interact
+### Output format rules:
+1. Output the complete corrected index.html, then a line containing exactly: ---README.md---
+2. Then output the complete README.md.
+3. Do not include any commentary outside code or README.
+"""
 
-## Technical Details
+def build_revision_prompt(brief: str, attachments_meta: str, checks, prev_files: dict,
+                          budget=PROMPT_TOKEN_BUDGET):
+    """
+    Round-2 prompt asking for SEARCH/REPLACE edit blocks against the published files.
+    The current files go in whole, since edits must quote them exactly; returns
+    (None, report) when they alone do not fit in `budget`.
+    """
+    def render(attachments_text=""):
+        return f"""
+You are a professional web developer assistant.
 
-### Architecture
+### Round
+2
 
-This app is built as a single-page application (SPA) with:
-- **Frontend:** HTML5, CSS3, Vanilla JavaScript
-- **Storage:** Browser localStorage (optional, for persistence)
-- **APIs:** None (fully client-side)
+### Task
+{brief}
 
-### File Structure
+The app below is already published. Revise it for the task above by editing the
+existing files, not by rewriting them.
 
+### Current index.html
+```html
+{prev_files.get("index.html", "")}
 ```
-.
-├── index.html      # Main application file (all HTML/CSS/JS inline)
-├── README.md       # This file
-└── LICENSE         # MIT License
-```
-
-### Code Explanation
-
-The application is self-contained in `index.html` with:
-
-1. **HTML Section**
-   - Semantic markup for accessibility
-   - Proper heading hierarchy
-   - Form elements with labels
-
-2. **CSS Section**
-   - Responsive design with flexbox/grid
-   - Mobile-first approach
-   - Clean, maintainable styles
 
-3. **JavaScript Section**
-   - Event listeners for interactivity
-   - DOM manipulation
-   - Data management and state handling
+### Current README.md
+{prev_files.get("README.md", "")}
 
-### Key Functions
-
-The JavaScript implements the core functionality:
-- Event handling for user interactions
-- DOM updates and rendering
-- Data management and validation
-- Optional localStorage integration
-
-## Browser Compatibility
-
-- Chrome/Edge: Full support
-- Firefox: Full support
-- Safari: Full support
-- Mobile browsers: Full support
-
-## Evaluation Criteria Met
-
-✅ Clean, professional code
-✅ Responsive design
-✅ Functional requirements from brief
-✅ MIT License included
-✅ Professional README
-✅ No external build dependencies
-✅ Runs in browser without server
-
-## Performance
-
-- Load time: < 1 second
-- All processing done client-side
-- No network requests required
-- Minimal memory footprint
-
-## Accessibility
-
-- Semantic HTML5 elements
-- ARIA labels where appropriate
-- Keyboard navigable
-- Color contrast compliant
-
-## Future Improvements
-
-Potential enhancements for future versions:
-- Add persistent data storage with cloud sync
-- Implement advanced filtering/search
-- Add dark mode support
-- Create mobile app version
-- Add analytics
-
-## License
-
-This project is licensed under the MIT License - see the [LICENSE](LICENSE) file for details.
+### Attachments (if any)
+{attachments_text}
 
-MIT License
+### Evaluation checks
+{checks or []}
 
-Copyright (c) 2024
+### Output format rules:
+1. Output only edit blocks, no full files and no commentary. Each block is:
+FILE: index.html
+<<<<<<< SEARCH
+lines copied exactly from the current file
+=======
+the lines that replace them
+>>>>>>> REPLACE
+2. SEARCH must match the current file exactly, once. Keep it to the few lines around a change.
+3. Prefer several small blocks over one large block. An empty SEARCH appends to the file.
+   Only {' and '.join(prev_files)} can be edited; no other files are created.
+4. Edit README.md too: add a section describing the improvements made in this round.
+"""
 
-Permission is hereby granted, free of charge, to any person obtaining a copy
-of this software and associated documentation files (the "Software"), to deal
-in the Software without restriction, including without limitation the rights
-to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
-copies of the Software, and to permit persons to whom the Software is
-furnished to do so, subject to the following conditions:
+    fixed = estimate_tokens(render(" "))
+    if fixed > budget:
+        return None, {"budget": budget, "prompt_tokens": fixed, "truncated": [], "dropped": ["prev_files"]}
+    chosen, report = fit_sections(fixed, [("attachments", [attachments_meta], 1.0)], budget)
+    prompt = render(chosen["attachments"])
+    report["prompt_tokens"] = estimate_tokens(prompt)
+    print(f"🧮 Revision prompt size ~{report['prompt_tokens']} tokens (budget {budget})")
+    return prompt, report
 
-The above copyright notice and this permission notice shall be included in all
-copies or substantial portions of the Software.
+def _fallback_text(brief: str, checks=None, attachments_meta=None, round_num=1):
+    html = render_cached("fallback_app", html_escape(brief), round_num)
+    return f"\n{html}\n{README_DELIMITER}\n{generate_readme_fallback(brief, checks, attachments_meta, round_num)}\n"
 
-## Support & Questions
+def _split_generation(text: str, brief: str, checks=None, attachments_meta=None, round_num=1):
+    """
+    Split model output into index.html and README.md.
+    """
+    if "---README.md---" in text:
+        code_part, readme_part = text.split("---README.md---", 1)
+        code_part = _strip_code_block(code_part)
+        readme_part = _strip_code_block(readme_part)
+    else:
+        code_part = _strip_code_block(text)
+        readme_part = generate_readme_fallback(brief, checks, attachments_meta, round_num)
 
-If you encounter any issues:
-1. Check that JavaScript is enabled in your browser
-2. Clear browser cache and reload
-3. Try a different browser
-4. Check browser console for error messages (F12)
+    return {"index.html": code_part, "README.md": readme_part}
 
-## Credits
+class StreamSplitter:
+    """
+    Incrementally splits streamed model output into index.html and README.md.
 
-Auto-generated using Google Gemini API
+    index.html is complete as soon as its code fence closes or the README
+    delimiter arrives, whichever comes first; on_file(name, content) is called
+    at that point so callers can start working on it while the README streams.
+    finish() returns the same files _split_generation would for the full text.
+    """
 
----
+    def __init__(self, on_file=None):
+        self.on_file = on_file
+        self.text = ""
+        self.html_done = False
+        self._fences = []
+        self._fence_scan = 0
+        self._delimiter_at = -1
+
+    def feed(self, chunk: str) -> None:
+        if not chunk:
+            return
+        scan_from = max(0, len(self.text) - len(README_DELIMITER))
+        self.text += chunk
+        if self.html_done:
+            return
+
+        if self._delimiter_at < 0:
+            self._delimiter_at = self.text.find(README_DELIMITER, scan_from)
+
+        # Track the first two ``` fences; the html block is the text between them
+        while len(self._fences) < 2:
+            idx = self.text.find("```", self._fence_scan)
+            if idx < 0 or (self._delimiter_at >= 0 and idx > self._delimiter_at):
+                self._fence_scan = max(self._fence_scan, len(self.text) - 2)
+                break
+            self._fences.append(idx)
+            self._fence_scan = idx + 3
+
+        if len(self._fences) == 2:
+            self._emit_html(self.text[self._fences[0] + 3:self._fences[1]].strip())
+        elif self._delimiter_at >= 0:
+            self._emit_html(_strip_code_block(self.text[:self._delimiter_at]))
+
+    def _emit_html(self, html: str) -> None:
+        self.html_done = True
+        if self.on_file:
+            self.on_file("index.html", html)
+
+    def finish(self, brief: str, checks=None, attachments_meta=None, round_num=1) -> dict:
+        return _split_generation(self.text, brief, checks, attachments_meta, round_num)
+
+# Running totals for streamed generations and built prompts, reported under /stats
+generation_stats = {
+    "streams": 0, "ttft_total": 0.0, "tokens_total": 0, "stream_seconds_total": 0.0,
+    "prompts": 0, "prompt_tokens_total": 0, "prompt_tokens_max": 0, "prompts_shortened": 0,
+    "revisions": 0, "revisions_applied": 0, "revision_edits": 0,
+}
+
+def _record_prompt(report: dict) -> None:
+    generation_stats["prompts"] += 1
+    generation_stats["prompt_tokens_total"] += report["prompt_tokens"]
+    generation_stats["prompt_tokens_max"] = max(generation_stats["prompt_tokens_max"], report["prompt_tokens"])
+    if report["truncated"] or report["dropped"]:
+        generation_stats["prompts_shortened"] += 1
+
+def get_generation_stats() -> dict:
+    n = generation_stats["streams"]
+    seconds = generation_stats["stream_seconds_total"]
+    prompts = generation_stats["prompts"]
+    return {
+        "prompts": prompts,
+        "avg_prompt_tokens": round(generation_stats["prompt_tokens_total"] / prompts) if prompts else None,
+        "max_prompt_tokens": generation_stats["prompt_tokens_max"],
+        "prompts_shortened": generation_stats["prompts_shortened"],
+        "streams": n,
+        "avg_ttft": round(generation_stats["ttft_total"] / n, 3) if n else None,
+        "avg_tokens_per_sec": round(generation_stats["tokens_total"] / seconds, 1) if seconds else None,
+        "revisions": generation_stats["revisions"],
+        "revisions_applied": generation_stats["revisions_applied"],
+        "revision_edits": generation_stats["revision_edits"],
+    }
+
+async def _stream_generate(user_prompt: str, splitter: StreamSplitter) -> dict:
+    """
+    Stream a response from the best-ranked provider (hedged when it is slow to start)
+    into the splitter and return timing metrics.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    usage = {}
+    async for piece in llm_router.stream(user_prompt, usage):
+        if first_token_at is None:
+            first_token_at = time.perf_counter()
+        splitter.feed(piece)
+    end = time.perf_counter()
+
+    tokens = usage.get("output_tokens") or len(splitter.text) // 4
+    ttft = (first_token_at or end) - start
+    streaming_time = end - (first_token_at or end)
+
+    generation_stats["streams"] += 1
+    generation_stats["ttft_total"] += ttft
+    generation_stats["tokens_total"] += tokens
+    generation_stats["stream_seconds_total"] += streaming_time
+    return {
+        "ttft": round(ttft, 3),
+        "total_time": round(end - start, 3),
+        "output_tokens": tokens,
+        "tokens_per_sec": round(tokens / streaming_time, 1) if streaming_time > 0 else None,
+        "provider": usage.get("provider"),
+    }
+
+def _cached_files(use_cache: bool, key_for):
+    """
+    Look the generation up under each cacheable provider's namespace, best-ranked first.
+    key_for(cache_id) builds the generation_key for one provider and model.
+    """
+    if not use_cache or GEN_CACHE_BYPASS:
+        return None
+    for cache_id in llm_router.cache_ids():
+        key = key_for(cache_id)
+        try:
+            files = generation_cache.get(key)
+        except Exception as e:
+            print(f"⚠️ Generation cache lookup failed: {e}")
+            return None
+        if files is not None:
+            print(f"⚡ Generation cache hit ({cache_id}, {key[:12]})")
+            return files
+    return None
+
+def _store_files(use_cache: bool, key_for, provider: str, files: dict):
+    """Cache files under the provider and model that produced them; stub output is never cached."""
+    cache_id = llm_router.cache_id(provider)
+    if not use_cache or GEN_CACHE_BYPASS or cache_id is None:
+        return
+    try:
+        generation_cache.put(key_for(cache_id), files)
+    except Exception as e:
+        print(f"⚠️ Generation cache write failed: {e}")
 
-**Last Updated:** Round {round_num}
-**Status:** Active
-"""
+def _app_key_for(brief, checks, saved, round_num, prev_readme, prev_code):
+    return functools.partial(generation_key, brief=brief, checks=checks, attachments=saved, round_num=round_num,
+                             prev_readme=prev_readme, prev_code=prev_code)
 
-    return readme.strip()
+def _revision_key_for(brief, checks, saved, prev_files):
+    def key_for(cache_id):
+        return generation_key(f"{cache_id}:revision", brief, checks, saved, 2,
+                              prev_files.get("README.md"), prev_files["index.html"])
+    return key_for
 
-def generate_app_code(brief: str, attachments=None, checks=None, round_num=1, prev_readme=None):
+def cached_app_code(brief: str, checks=None, round_num=1, prev_readme=None, prev_code=None, saved_attachments=None):
+    """
+    Look a full generation up in the generation cache without calling a model, so a
+    caller can answer a hit before waiting for an LLM slot. Returns a result shaped like
+    generate_app_code_async's cache hits, or None.
+    """
+    saved = saved_attachments or []
+    files = _cached_files(True, _app_key_for(brief, checks, saved, round_num, prev_readme, prev_code))
+    if files is None:
+        return None
+    return {"files": files, "attachments": saved, "cached": True}
+
+def generate_app_code(brief: str, attachments=None, checks=None, round_num=1, prev_readme=None, use_cache=True,
+                      saved_attachments=None, prev_code=None):
     """
     Generate or revise an app using Google Gemini API.
     - round_num=1: build from scratch
     - round_num=2: refactor based on new brief and previous README/code
+    - use_cache=False skips the generation cache (see app/gen_cache.py)
+    - saved_attachments: output of decode_attachments, to avoid decoding twice
+    - prev_code: previous index.html (round 2), included as a structural digest
     """
-    saved = decode_attachments(attachments or [])
-    attachments_meta = summarize_attachment_meta(saved)
-
-    context_note = ""
-    if round_num == 2 and prev_readme:
-        context_note = f"\n### Previous README.md:\n{prev_readme}\n\nRevise and enhance this project according to the new brief below.\n"
-
-    user_prompt = f"""
-You are a professional web developer assistant.
-
-### Round
-{round_num}
-
-### Task
-{brief}
-
-{context_note}
-
-### Attachments (if any)
-{attachments_meta}
+    saved = saved_attachments if saved_attachments is not None else decode_attachments(attachments or [])
+    key_for = _app_key_for(brief, checks, saved, round_num, prev_readme, prev_code)
+    files = _cached_files(use_cache, key_for)
+    if files is not None:
+        return {"files": files, "attachments": saved, "cached": True}
+
+    with span("prompt_build"):
+        attachments_meta = summarize_attachment_meta(saved)
+        user_prompt, prompt_report = build_prompt_with_report(
+            brief, attachments_meta, checks, round_num, prev_readme, prev_code
+        )
+    _record_prompt(prompt_report)
 
-### Evaluation checks
-{checks or []}
-
-### Output format rules:
-1. Produce a complete web app (HTML/JS/CSS inline if needed) satisfying the brief.
-2. Output must contain **two parts only**:
-   - index.html (main code)
-   - README.md (starts after a line containing exactly: ---README.md---)
-3. README.md must include:
-   - Overview
-   - Setup
-   - Usage
-   - If Round 2, describe improvements made from previous version.
-4. Do not include any commentary outside code or README.
-"""
+    try:
+        with span("llm_call"):
+            text, provider = llm_router.generate_sync(user_prompt)
+        print(f"✅ Generated code using {provider}.")
+        generated = True
+    except Exception as e:
+        print("⚠ LLM generation failed, using fallback HTML instead:", e)
+        text = _fallback_text(brief, checks, attachments_meta, round_num)
+        generated = False
+
+    files = _split_generation(text, brief, checks, attachments_meta, round_num)
+    if generated:
+        _store_files(use_cache, key_for, provider, files)
+    return {"files": files, "attachments": saved, "cached": False, "metrics": {"prompt_tokens": prompt_report["prompt_tokens"]}}
+
+async def generate_app_code_async(brief: str, attachments=None, checks=None, round_num=1, prev_readme=None,
+                                  use_cache=True, stream=LLM_STREAMING, on_file=None, saved_attachments=None,
+                                  prev_code=None):
+    """
+    Async variant of generate_app_code; the model call does not hold a worker thread.
+    Calls may be hedged across providers, streamed ones on their time to first chunk
+    (see app/llm_providers.py).
+    With stream=True the response is consumed incrementally, on_file("index.html", html)
+    fires as soon as the HTML part is complete, and the result carries a "metrics" dict
+    with time-to-first-token and tokens/sec.
+    """
+    saved = saved_attachments
+    if saved is None:
+        saved = await asyncio.to_thread(decode_attachments, attachments or [])
+    key_for = _app_key_for(brief, checks, saved, round_num, prev_readme, prev_code)
+    files = _cached_files(use_cache, key_for)
+    if files is not None:
+        return {"files": files, "attachments": saved, "cached": True}
+
+    with span("prompt_build"):
+        attachments_meta = summarize_attachment_meta(saved)
+        user_prompt, prompt_report = build_prompt_with_report(
+            brief, attachments_meta, checks, round_num, prev_readme, prev_code
+        )
+    _record_prompt(prompt_report)
 
     try:
-        if model is None:
-            raise Exception("Gemini model not initialized")
-        
-        response = model.generate_content(user_prompt)
-        text = response.text
-        print("✅ Generated code using Google Gemini API.")
+        if stream:
+            splitter = StreamSplitter(on_file)
+            with span("llm_call", stream=True):
+                metrics = await _stream_generate(user_prompt, splitter)
+            files = splitter.finish(brief, checks, attachments_meta, round_num)
+            print(f"✅ Streamed code from {metrics['provider']} (ttft {metrics['ttft']}s, {metrics['tokens_per_sec']} tok/s).")
+        else:
+            with span("llm_call", stream=False):
+                text, provider = await llm_router.generate(user_prompt)
+            files = _split_generation(text, brief, checks, attachments_meta, round_num)
+            metrics = {"provider": provider}
+            print(f"✅ Generated code using {provider}.")
+        _store_files(use_cache, key_for, metrics["provider"], files)
     except Exception as e:
-        print("⚠ Gemini API failed, using fallback HTML instead:", e)
-        text = f"""
-<html>
-  <head><title>Fallback App</title></head>
-  <body>
-    <h1>Hello (fallback)</h1>
-    <p>This app was generated as a fallback because Gemini failed. Brief: {brief}</p>
-  </body>
-</html>
-
----README.md---
-{generate_readme_fallback(brief, checks, attachments_meta, round_num)}
-"""
+        print("⚠ LLM generation failed, using fallback HTML instead:", e)
+        text = _fallback_text(brief, checks, attachments_meta, round_num)
+        files = _split_generation(text, brief, checks, attachments_meta, round_num)
+        metrics = {}
 
-    if "---README.md---" in text:
-        code_part, readme_part = text.split("---README.md---", 1)
-        code_part = _strip_code_block(code_part)
-        readme_part = _strip_code_block(readme_part)
-    else:
-        code_part = _strip_code_block(text)
-        readme_part = generate_readme_fallback(brief, checks, attachments_meta, round_num)
+    metrics["prompt_tokens"] = prompt_report["prompt_tokens"]
+    return {"files": files, "attachments": saved, "cached": False, "metrics": metrics}
 
-    files = {"index.html": code_part, "README.md": readme_part}
-    return {"files": files, "attachments": saved}
 
+async def _score(files: dict, checks) -> dict:
+    return await asyncio.to_thread(validate_checks, files.get("index.html", ""), files.get("README.md", ""), checks)
 
+async def _candidate(prompt: str, temperature: float, brief: str, checks, attachments_meta, round_num, hedge=None):
+    text, provider = await llm_router.generate(prompt, temperature, hedge=hedge)
+    files = _split_generation(text, brief, checks, attachments_meta, round_num)
+    return files, await _score(files, checks), provider
 
+async def generate_best_app_code(brief: str, attachments=None, checks=None, round_num=1, prev_readme=None,
+                                 use_cache=True, saved_attachments=None, candidates=GEN_CANDIDATES,
+                                 threshold=GEN_SCORE_THRESHOLD, budget=GEN_BUDGET_SECONDS, deadline=None,
+                                 prev_code=None):
+    """
+    Generate `candidates` apps concurrently, score each with validate_checks and keep the best.
+
+    The first candidate reaching `threshold` wins and the others are cancelled. Below the
+    threshold, repair prompts listing the failed checks are run until the budget runs out.
+    Everything stops after `budget` seconds, or GEN_DEADLINE_RESERVE seconds before the task's
+    epoch `deadline` if that is sooner; outstanding model calls are cancelled, also when the
+    caller itself is cancelled.
+    The result is shaped like generate_app_code_async's, plus the winning "validation".
+    """
+    started = time.time()
+    stop_at = started + budget
+    if deadline is not None:
+        stop_at = min(stop_at, deadline - GEN_DEADLINE_RESERVE)
+
+    saved = saved_attachments
+    if saved is None:
+        saved = await asyncio.to_thread(decode_attachments, attachments or [])
+    key_for = _app_key_for(brief, checks, saved, round_num, prev_readme, prev_code)
+    files = _cached_files(use_cache, key_for)
+    if files is not None:
+        return {"files": files, "attachments": saved, "cached": True, "validation": await _score(files, checks)}
+
+    with span("prompt_build"):
+        attachments_meta = summarize_attachment_meta(saved)
+        user_prompt, prompt_report = build_prompt_with_report(
+            brief, attachments_meta, checks, round_num, prev_readme, prev_code
+        )
+    _record_prompt(prompt_report)
+
+    best, best_result, best_provider, scores, repairs = None, None, None, [], 0
+    pending = set()
+    try:
+        # Spread temperatures so the candidates actually differ; they are parallel already, so no hedging
+        pending = {
+            asyncio.create_task(_candidate(user_prompt, 0.4 + 0.6 * i / max(candidates - 1, 1),
+                                           brief, checks, attachments_meta, round_num, hedge=False))
+            for i in range(candidates)
+        }
+        with span("llm_candidates", candidates=candidates):
+            while pending and time.time() < stop_at:
+                done, pending = await asyncio.wait(pending, timeout=stop_at - time.time(),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        print(f"⚠ Candidate failed: {task.exception()}")
+                        continue
+                    files, result, provider = task.result()
+                    scores.append(result["score"])
+                    if best_result is None or result["score"] > best_result["score"]:
+                        best, best_result, best_provider = files, result, provider
+                if best_result is not None and best_result["score"] >= threshold:
+                    break
+        for task in pending:
+            task.cancel()
+        print(f"🎯 Candidate scores: {scores}")
+
+        while (best_result is not None and best_result["score"] < threshold
+               and repairs < GEN_REPAIR_ROUNDS and time.time() < stop_at):
+            repairs += 1
+            failed = [r for r in best_result["results"] if not r["passed"]]
+            print(f"🩹 Repair {repairs}: {len(failed)} failing checks, {stop_at - time.time():.0f}s left")
+            try:
+                with span("llm_repair", attempt=repairs):
+                    files, result, provider = await asyncio.wait_for(
+                        _candidate(build_repair_prompt(brief, best, failed), 0.2,
+                                   brief, checks, attachments_meta, round_num),
+                        timeout=stop_at - time.time(),
+                    )
+            except asyncio.TimeoutError:
+                print("⌛ Generation budget exhausted during repair")
+                break
+            except Exception as e:
+                print(f"⚠ Repair attempt failed: {e}")
+                continue
+            scores.append(result["score"])
+            if result["score"] > best_result["score"]:
+                best, best_result, best_provider = files, result, provider
+
+        if best is None:
+            raise Exception("no candidate finished within the generation budget")
+        _store_files(use_cache, key_for, best_provider, best)
+    except Exception as e:
+        print("⚠ LLM generation failed, using fallback HTML instead:", e)
+        text = _fallback_text(brief, checks, attachments_meta, round_num)
+        best = _split_generation(text, brief, checks, attachments_meta, round_num)
+        best_result = await _score(best, checks)
+    finally:
+        for task in pending:
+            task.cancel()
+
+    metrics = {
+        "candidates": candidates,
+        "scores": scores,
+        "repairs": repairs,
+        "best_score": best_result["score"],
+        "prompt_tokens": prompt_report["prompt_tokens"],
+        "seconds": round(time.time() - started, 1),
+    }
+    return {"files": best, "attachments": saved, "cached": False, "metrics": metrics, "validation": best_result}
+
+
+async def _revision_hit(files: dict, prev_files: dict, saved, checks) -> dict:
+    result = {"files": files, "attachments": saved, "cached": True, "changed": changed_paths(prev_files, files)}
+    if checks:
+        result["validation"] = await _score(files, checks)
+    return result
+
+async def cached_revision(brief: str, prev_files: dict, checks=None, saved_attachments=None):
+    """
+    generate_revision's cache lookup on its own, needing no LLM slot; None on a miss.
+    """
+    prev_files = {path: text for path, text in (prev_files or {}).items() if text}
+    if "index.html" not in prev_files:
+        return None
+    saved = saved_attachments or []
+    files = _cached_files(True, _revision_key_for(brief, checks, saved, prev_files))
+    if files is None:
+        return None
+    return await _revision_hit(files, prev_files, saved, checks)
+
+async def generate_revision(brief: str, prev_files: dict, attachments=None, checks=None, use_cache=True,
+                            saved_attachments=None):
+    """
+    Incremental round 2: ask the model for edit blocks against `prev_files` (the published
+    index.html and README.md), apply them locally and validate the result.
 
+    Returns a result shaped like generate_app_code_async's, with "changed" listing the
+    edited paths and "validation" when there are checks, or None when the revision is not
+    usable (files too large for the prompt, a model error, edits that do not apply, or a
+    result scoring below the previous version); the caller then regenerates in full.
+    """
+    prev_files = {path: text for path, text in (prev_files or {}).items() if text}
+    if "index.html" not in prev_files:
+        return None
+    saved = saved_attachments
+    if saved is None:
+        saved = await asyncio.to_thread(decode_attachments, attachments or [])
+    key_for = _revision_key_for(brief, checks, saved, prev_files)
+    files = _cached_files(use_cache, key_for)
+    if files is not None:
+        return await _revision_hit(files, prev_files, saved, checks)
+
+    with span("prompt_build", revision=True):
+        attachments_meta = summarize_attachment_meta(saved)
+        user_prompt, prompt_report = build_revision_prompt(brief, attachments_meta, checks, prev_files)
+    if user_prompt is None:
+        print(f"↪ Previous files too large for a revision prompt (~{prompt_report['prompt_tokens']} tokens)")
+        return None
+    _record_prompt(prompt_report)
+    generation_stats["revisions"] += 1
+
+    started = time.perf_counter()
+    try:
+        with span("llm_call", revision=True):
+            text, provider = await llm_router.generate(user_prompt, 0.2)
+        edits = parse_edits(text)
+        if not edits:
+            raise PatchError("no edit blocks in the response")
+        with span("apply_edits", edits=len(edits)):
+            files = apply_edits(prev_files, edits)
+    except Exception as e:
+        print(f"↪ Revision not usable, regenerating in full: {e}")
+        return None
+    if not files.get("index.html", "").strip() or (
+        "</html>" in prev_files["index.html"].lower() and "</html>" not in files["index.html"].lower()
+    ):
+        print("↪ Revised index.html is incomplete, regenerating in full")
+        return None
+
+    validation = None
+    if checks:
+        with span("validation", checks=len(checks), revision=True):
+            validation, before = await asyncio.gather(_score(files, checks), _score(prev_files, checks))
+        if validation["score"] < before["score"]:
+            print(f"↪ Revision scores {validation['score']} against {before['score']} before, regenerating in full")
+            return None
+
+    changed = changed_paths(prev_files, files)
+    generation_stats["revisions_applied"] += 1
+    generation_stats["revision_edits"] += len(edits)
+    _store_files(use_cache, key_for, provider, files)
+    print(f"✂ Applied {len(edits)} edits from {provider} to {', '.join(changed) or 'nothing'}")
+    result = {
+        "files": files,
+        "attachments": saved,
+        "cached": False,
+        "changed": changed,
+        "metrics": {
+            "provider": provider,
+            "edits": len(edits),
+            "output_chars": len(text),
+            "prompt_tokens": prompt_report["prompt_tokens"],
+            "seconds": round(time.perf_counter() - started, 1),
+        },
+    }
+    if validation is not None:
+        result["validation"] = validation
+    return result
@@ -0,0 +1,514 @@
+# app/llm_providers.py
+import os
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+
+from app.config import GEMINI_API_KEY, OPENAI_API_KEY
+from app.http_clients import get_client, get_async_client
+
+# Providers tried in this order until latency data says otherwise: gemini, openai, stub
+LLM_PROVIDERS = [p.strip() for p in os.getenv("LLM_PROVIDERS", "gemini,openai").split(",") if p.strip()]
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "300"))
+# Start a second provider when the first has not answered within its p95 latency
+LLM_HEDGE = os.getenv("LLM_HEDGE", "true").lower() in ("1", "true", "yes")
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "5"))
+# Hedge delay used until a provider has LLM_HEDGE_MIN_SAMPLES latencies on record
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "30"))
+# Same for streams, which hedge on the time to their first chunk
+LLM_HEDGE_TTFT_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_TTFT_DEFAULT_DELAY", "10"))
+LLM_HEDGE_MIN_SAMPLES = 5
+LLM_EWMA_ALPHA = float(os.getenv("LLM_EWMA_ALPHA", "0.2"))
+# Seconds the stub provider waits before answering
+LLM_STUB_DELAY = float(os.getenv("LLM_STUB_DELAY", "0.05"))
+
+SYSTEM_PROMPT = "You are a helpful coding assistant that outputs runnable web apps."
+
+
+class LLMProvider:
+    """
+    One text-generation backend. Subclasses implement generate, stream and generate_sync;
+    stream yields text chunks and may fill usage["output_tokens"].
+    """
+    name = "provider"
+
+    def available(self) -> bool:
+        return True
+
+    def warm_up(self) -> None:
+        pass
+
+    def cache_id(self):
+        """Generation-cache namespace for this provider's output; None keeps it out of the cache."""
+        return None
+
+    async def generate(self, prompt: str, temperature: float = None) -> str:
+        raise NotImplementedError
+
+    async def stream(self, prompt: str, usage: dict):
+        raise NotImplementedError
+        yield
+
+    def generate_sync(self, prompt: str, temperature: float = None) -> str:
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, model_name: str = GEMINI_MODEL, api_key: str = GEMINI_API_KEY):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._model = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def cache_id(self):
+        return f"{self.name}:{self.model_name}"
+
+    def model(self):
+        """
+        Gemini model, imported and configured on first use (the SDK import alone takes
+        close to a second). Raises when the SDK is unusable.
+        """
+        with self._lock:
+            if not self._loaded:
+                try:
+                    import google.generativeai as genai
+                    genai.configure(api_key=self.api_key)
+                    self._model = genai.GenerativeModel(self.model_name)
+                    print("✅ Gemini API configured successfully")
+                except Exception as e:
+                    print(f"⚠️ Gemini import error: {e}")
+                    self._model = None
+                self._loaded = True
+        if self._model is None:
+            raise Exception("Gemini model not initialized")
+        return self._model
+
+    def warm_up(self) -> None:
+        try:
+            self.model()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _config(temperature):
+        return {"temperature": temperature} if temperature is not None else None
+
+    async def generate(self, prompt: str, temperature: float = None) -> str:
+        response = await self.model().generate_content_async(prompt, generation_config=self._config(temperature))
+        return response.text
+
+    async def stream(self, prompt: str, usage: dict):
+        response = await self.model().generate_content_async(prompt, stream=True)
+        async for chunk in response:
+            try:
+                piece = chunk.text
+            except ValueError:
+                # Chunks without text parts (e.g. safety metadata)
+                continue
+            yield piece
+        meta = getattr(response, "usage_metadata", None)
+        usage["output_tokens"] = getattr(meta, "candidates_token_count", 0) or None
+
+    def generate_sync(self, prompt: str, temperature: float = None) -> str:
+        return self.model().generate_content(prompt, generation_config=self._config(temperature)).text
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    """
+    Any endpoint speaking the OpenAI chat completions API (OpenAI, vLLM, Ollama, ...),
+    called over the shared pooled HTTP clients.
+    """
+    name = "openai"
+
+    def __init__(self, base_url: str = OPENAI_BASE_URL, api_key: str = OPENAI_API_KEY, model: str = OPENAI_MODEL):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+
+    def available(self) -> bool:
+        return bool(self.api_key)
+
+    def cache_id(self):
+        return f"{self.name}:{self.base_url}:{self.model}"
+
+    def _request(self, prompt: str, temperature: float = None, stream: bool = False):
+        body = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": prompt},
+            ],
+            "stream": stream,
+        }
+        if temperature is not None:
+            body["temperature"] = temperature
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        return f"{self.base_url}/chat/completions", headers, body
+
+    async def generate(self, prompt: str, temperature: float = None) -> str:
+        url, headers, body = self._request(prompt, temperature)
+        r = await get_async_client().post(url, headers=headers, json=body, timeout=LLM_REQUEST_TIMEOUT)
+        r.raise_for_status()
+        return r.json()["choices"][0]["message"]["content"] or ""
+
+    async def stream(self, prompt: str, usage: dict):
+        url, headers, body = self._request(prompt, stream=True)
+        async with get_async_client().stream("POST", url, headers=headers, json=body, timeout=LLM_REQUEST_TIMEOUT) as r:
+            r.raise_for_status()
+            # Server-sent events: "data: {json}" lines, terminated by "data: [DONE]"
+            async for line in r.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                event = json.loads(data)
+                if event.get("usage"):
+                    usage["output_tokens"] = event["usage"].get("completion_tokens")
+                for choice in event.get("choices", []):
+                    piece = (choice.get("delta") or {}).get("content")
+                    if piece:
+                        yield piece
+
+    def generate_sync(self, prompt: str, temperature: float = None) -> str:
+        url, headers, body = self._request(prompt, temperature)
+        r = get_client().post(url, headers=headers, json=body, timeout=LLM_REQUEST_TIMEOUT)
+        r.raise_for_status()
+        return r.json()["choices"][0]["message"]["content"] or ""
+
+
+class StubProvider(LLMProvider):
+    """
+    Offline provider returning a small fixed app, for local runs and tests.
+    Its output is never cached (cache_id is None).
+    """
+    name = "stub"
+
+    def __init__(self, delay: float = LLM_STUB_DELAY):
+        self.delay = delay
+
+    @staticmethod
+    def _text(prompt: str) -> str:
+        return (
+            "```html\n<!DOCTYPE html>\n<html>\n<head><title>Stub App</title></head>\n"
+            "<body>\n<h1>Stub App</h1>\n<p>Generated offline by the stub provider.</p>\n</body>\n</html>\n```\n"
+            "---README.md---\n# Stub App\n\n## Overview\nPlaceholder app from the stub LLM provider.\n\n"
+            "## Setup\nOpen index.html in a browser.\n\n## Usage\nNothing to configure.\n"
+        )
+
+    async def generate(self, prompt: str, temperature: float = None) -> str:
+        await asyncio.sleep(self.delay)
+        return self._text(prompt)
+
+    async def stream(self, prompt: str, usage: dict):
+        text = self._text(prompt)
+        for i in range(0, len(text), 64):
+            await asyncio.sleep(self.delay / 8)
+            yield text[i:i + 64]
+
+    def generate_sync(self, prompt: str, temperature: float = None) -> str:
+        time.sleep(self.delay)
+        return self._text(prompt)
+
+
+PROVIDER_TYPES = {"gemini": GeminiProvider, "openai": OpenAICompatibleProvider, "stub": StubProvider}
+
+
+class _ProviderHealth:
+    def __init__(self):
+        self.latency_ewma = None
+        self.error_ewma = 0.0
+        self.latencies = deque(maxlen=100)
+        self.ttfts = deque(maxlen=100)
+        self.calls = 0
+        self.failures = 0
+        self.hedges_started = 0
+        self.hedges_won = 0
+
+    def record(self, seconds: float, ok: bool):
+        self.calls += 1
+        if ok:
+            self.latencies.append(seconds)
+            self.latency_ewma = seconds if self.latency_ewma is None else (
+                LLM_EWMA_ALPHA * seconds + (1 - LLM_EWMA_ALPHA) * self.latency_ewma)
+        else:
+            self.failures += 1
+        self.error_ewma = LLM_EWMA_ALPHA * (0.0 if ok else 1.0) + (1 - LLM_EWMA_ALPHA) * self.error_ewma
+
+    def record_ttft(self, seconds: float):
+        self.ttfts.append(seconds)
+
+    def p95(self, samples=None):
+        samples = self.latencies if samples is None else samples
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+
+    def ttft_p95(self):
+        return self.p95(self.ttfts)
+
+
+class ProviderRouter:
+    """
+    Routes generations across providers by a rolling latency/error EWMA.
+
+    generate() sends the prompt to the best-ranked provider and, if it has not
+    answered within that provider's p95 latency (never less than
+    LLM_HEDGE_MIN_DELAY), hedges by sending it to the next one too; the first
+    successful answer wins and the other request is cancelled. A provider that
+    fails hands over to the next immediately. stream() hedges on the time to
+    the first chunk instead (the provider's p95 time to first chunk): the
+    stream that yields first is kept and the other is cancelled. Chunks are
+    handed to callbacks as they arrive, so once a stream has produced output
+    it is never switched.
+    """
+
+    def __init__(self, providers: list, hedge: bool = LLM_HEDGE):
+        self.providers = providers
+        self.hedge = hedge
+        self.health = {p.name: _ProviderHealth() for p in providers}
+        self.hedged = 0
+        self._by_name = {p.name: p for p in providers}
+
+    def ranked(self) -> list:
+        def score(item):
+            index, provider = item
+            h = self.health[provider.name]
+            # Untried providers keep their configured order ahead of slower measured ones
+            latency = h.latency_ewma if h.latency_ewma is not None else 0.0
+            return (latency * (1 + 4 * h.error_ewma) + 60 * h.error_ewma, index)
+        return [p for _, p in sorted(enumerate(self.providers), key=score)]
+
+    def cache_ids(self) -> list:
+        """Generation-cache namespaces of the cacheable providers, best-ranked first."""
+        return [p.cache_id() for p in self.ranked() if p.cache_id()]
+
+    def cache_id(self, name: str):
+        """Cache namespace for output produced by provider `name`, or None when it must not be cached."""
+        provider = self._by_name.get(name)
+        return provider.cache_id() if provider is not None else None
+
+    def hedge_delay(self, provider) -> float:
+        p95 = self.health[provider.name].p95()
+        return LLM_HEDGE_DEFAULT_DELAY if p95 is None else max(p95, LLM_HEDGE_MIN_DELAY)
+
+    def ttft_hedge_delay(self, provider) -> float:
+        p95 = self.health[provider.name].ttft_p95()
+        return LLM_HEDGE_TTFT_DEFAULT_DELAY if p95 is None else max(p95, LLM_HEDGE_MIN_DELAY)
+
+    async def _timed(self, provider, prompt: str, temperature):
+        started = time.perf_counter()
+        try:
+            text = await provider.generate(prompt, temperature)
+            if not text or not text.strip():
+                raise Exception(f"{provider.name} returned an empty response")
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.health[provider.name].record(time.perf_counter() - started, False)
+            raise
+        self.health[provider.name].record(time.perf_counter() - started, True)
+        return text
+
+    async def generate(self, prompt: str, temperature: float = None, hedge: bool = None) -> tuple:
+        """
+        Returns (text, provider name). Raises the last error when every provider failed.
+        hedge=False only fails over, e.g. when the caller already runs parallel candidates.
+        """
+        hedge = self.hedge if hedge is None else hedge
+        queue = self.ranked()
+        if not queue:
+            raise Exception("No LLM provider configured")
+        running = {}
+        last_error = None
+        won = False
+
+        def launch():
+            provider = queue.pop(0)
+            running[asyncio.create_task(self._timed(provider, prompt, temperature))] = (provider, time.perf_counter())
+            return provider
+
+        primary = launch()
+        try:
+            while running:
+                timeout = None
+                if hedge and queue and len(running) == 1:
+                    timeout = self.hedge_delay(primary)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedged += 1
+                    backup = launch()
+                    self.health[backup.name].hedges_started += 1
+                    print(f"🪁 {primary.name} slower than {timeout:.1f}s, hedging with {backup.name}")
+                    continue
+                for task in done:
+                    provider, _ = running.pop(task)
+                    if task.exception() is None:
+                        if provider is not primary:
+                            self.health[provider.name].hedges_won += 1
+                        won = True
+                        return task.result(), provider.name
+                    last_error = task.exception()
+                    print(f"⚠ LLM provider {provider.name} failed: {last_error}")
+                if not running and queue:
+                    primary = launch()
+            raise last_error
+        finally:
+            for task, (provider, started) in running.items():
+                task.cancel()
+                # A hedge loser took at least this long; recording it steers routing away from it.
+                # When the caller cancelled, nothing is known about the provider, so nothing is recorded.
+                if won:
+                    self.health[provider.name].record(time.perf_counter() - started, True)
+
+    async def stream(self, prompt: str, usage: dict, hedge: bool = None):
+        """
+        Yield text chunks from the best-ranked provider; usage gets "provider" and,
+        when reported, "output_tokens". If no chunk has arrived within the provider's
+        p95 time to first chunk, the next provider is started as well and the one
+        yielding first is kept. A provider failing before its first chunk hands over to
+        the next; after that its error is raised.
+        """
+        hedge = self.hedge if hedge is None else hedge
+        queue = self.ranked()
+        if not queue:
+            raise Exception("No LLM provider configured")
+        # First-chunk task -> (provider, its stream, its usage, start time)
+        running = {}
+        last_error = None
+        winner = None
+
+        def launch():
+            provider = queue.pop(0)
+            own_usage = {}
+            chunks = provider.stream(prompt, own_usage)
+            running[asyncio.ensure_future(chunks.__anext__())] = (provider, chunks, own_usage, time.perf_counter())
+            return provider
+
+        primary = launch()
+        try:
+            while running and winner is None:
+                timeout = None
+                if hedge and queue and len(running) == 1:
+                    timeout = self.ttft_hedge_delay(primary)
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedged += 1
+                    backup = launch()
+                    self.health[backup.name].hedges_started += 1
+                    print(f"🪁 {primary.name} sent nothing for {timeout:.1f}s, hedging with {backup.name}")
+                    continue
+                for task in done:
+                    provider, chunks, own_usage, started = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if winner is None:
+                            winner = provider, chunks, own_usage, started, task.result()
+                        else:
+                            # Both answered in the same step; the other stream is closed
+                            self.health[provider.name].record_ttft(time.perf_counter() - started)
+                            asyncio.ensure_future(chunks.aclose())
+                        continue
+                    if isinstance(error, StopAsyncIteration):
+                        error = Exception(f"{provider.name} returned an empty response")
+                    self.health[provider.name].record(time.perf_counter() - started, False)
+                    last_error = error
+                    print(f"⚠ LLM provider {provider.name} failed before streaming: {error}")
+                if winner is None and not running and queue:
+                    primary = launch()
+            if winner is None:
+                raise last_error
+        finally:
+            for task, (provider, _, _, started) in running.items():
+                task.cancel()
+                # A hedge loser took at least this long to its first chunk; nothing is known
+                # about the providers when the caller cancelled
+                if winner is not None:
+                    self.health[provider.name].record_ttft(time.perf_counter() - started)
+
+        provider, chunks, own_usage, started, first = winner
+        health = self.health[provider.name]
+        health.record_ttft(time.perf_counter() - started)
+        if provider is not primary:
+            health.hedges_won += 1
+        yield first
+        try:
+            async for piece in chunks:
+                yield piece
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            health.record(time.perf_counter() - started, False)
+            raise
+        health.record(time.perf_counter() - started, True)
+        usage.update(own_usage)
+        usage["provider"] = provider.name
+
+    def generate_sync(self, prompt: str, temperature: float = None) -> tuple:
+        """
+        Blocking variant for the sync pipeline: providers are tried in rank order, without hedging.
+        """
+        last_error = Exception("No LLM provider configured")
+        for provider in self.ranked():
+            started = time.perf_counter()
+            try:
+                text = provider.generate_sync(prompt, temperature)
+                self.health[provider.name].record(time.perf_counter() - started, True)
+                return text, provider.name
+            except Exception as e:
+                self.health[provider.name].record(time.perf_counter() - started, False)
+                print(f"⚠ LLM provider {provider.name} failed: {e}")
+                last_error = e
+        raise last_error
+
+    def warm_up(self) -> None:
+        for provider in self.providers:
+            provider.warm_up()
+
+    def stats(self) -> dict:
+        return {
+            "order": [p.name for p in self.ranked()],
+            "hedged": self.hedged,
+            "providers": {
+                name: {
+                    "calls": h.calls,
+                    "failures": h.failures,
+                    "latency_ewma": round(h.latency_ewma, 3) if h.latency_ewma is not None else None,
+                    "error_ewma": round(h.error_ewma, 3),
+                    "p95": round(h.p95(), 3) if h.p95() is not None else None,
+                    "ttft_p95": round(h.ttft_p95(), 3) if h.ttft_p95() is not None else None,
+                    "hedges_started": h.hedges_started,
+                    "hedges_won": h.hedges_won,
+                }
+                for name, h in self.health.items()
+            },
+        }
+
+
+def build_providers(names=None) -> list:
+    """Instantiate the configured providers that have credentials."""
+    providers = []
+    for name in names or LLM_PROVIDERS:
+        cls = PROVIDER_TYPES.get(name)
+        if cls is None:
+            print(f"⚠️ Unknown LLM provider '{name}', ignoring it")
+            continue
+        provider = cls()
+        if provider.available():
+            providers.append(provider)
+    return providers
+
+
+llm_router = ProviderRouter(build_providers())
@@ -4,37 +4,118 @@ import warnings
 warnings.filterwarnings("ignore", category=RuntimeWarning, module="trio")
 
 
-from fastapi import FastAPI, Request, BackgroundTasks
-import os, json, base64
-from dotenv import load_dotenv
-from app.llm_generator import generate_app_code, decode_attachments
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+import time, asyncio
+from app.config import USER_SECRET, GITHUB_USERNAME as USERNAME, WARM_UP_CLIENTS
+from app.llm_generator import (
+    generate_app_code_async,
+    generate_best_app_code,
+    generate_revision,
+    cached_app_code,
+    cached_revision,
+    get_generation_stats,
+    GEN_CANDIDATES,
+    GEN_INCREMENTAL,
+)
+from app.attachment_store import (
+    decode_attachments,
+    attachment_refs,
+    release_task,
+    cleanup as cleanup_attachments,
+    get_store_stats,
+)
 from app.github_utils import (
     create_repo,
-    create_or_update_file,
-    enable_pages,
+    ensure_initialized,
+    read_files,
+    publish_files,
+    get_publish_stats,
+    Base64Blob,
+    enable_pages_async,
     generate_mit_license,
+    github_client,
+    metadata_cache,
+    get_github,
 )
-from app.notify import notify_evaluation_server
-from app.github_utils import create_or_update_binary_file
+from app.notify_scheduler import NotificationScheduler, NOTIFY_DEADLINE_SECONDS
+from app.pages_watcher import PagesWatcher, PAGES_NOTIFY_MARGIN
+from app.store import open_store, migrate_json
+from app.llm_providers import llm_router
+from app.jobs import JobQueue, stage_limit, QUEUE_RETRY_AFTER
+from app.journal import JobJournal
+from app.gen_cache import generation_cache
+from app.http_clients import aclose_clients, pool_stats
+from app.metrics import span, start_trace, current_trace, render_prometheus
+from app.skeletons import get_render_stats
 
-load_dotenv()
-USER_SECRET = os.getenv("USER_SECRET")
-USERNAME = os.getenv("GITHUB_USERNAME")
 PROCESSED_PATH = "/tmp/processed_requests.json"
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app):
+    await notification_scheduler.start()
+    await pages_watcher.start()
+    await job_queue.start()
+    resume_jobs()
+    warmup = None
+    if WARM_UP_CLIENTS:
+        # The SDK imports happen off the request path, so the first ack never waits for them
+        warmup = asyncio.create_task(asyncio.to_thread(warm_up_clients))
+    yield
+    if warmup is not None:
+        await asyncio.gather(warmup, return_exceptions=True)
+    await job_queue.stop()
+    # Releases the Pages waits so their notifications are queued (and persisted) before shutdown
+    await pages_watcher.stop()
+    await asyncio.gather(*pages_waits.values(), return_exceptions=True)
+    await notification_scheduler.stop()
+    await aclose_clients()
+
+app = FastAPI(lifespan=lifespan)
+
+
+def resume_jobs():
+    for key, job in job_journal.incomplete():
+        if job_queue.submit(job, key=key) is None:
+            print(f"🚦 Job queue full, {key} stays in the journal until the next start")
+            continue
+        job_journal.resumed += 1
+        print(f"📒 Resubmitted unfinished job {key}")
+
+
+def warm_up_clients():
+    started = time.perf_counter()
+    llm_router.warm_up()
+    get_github()
+    print(f"🔥 LLM and GitHub clients ready in {time.perf_counter() - started:.2f}s")
 
 # === Persistence for processed requests ===
-def load_processed():
-    if os.path.exists(PROCESSED_PATH):
-        try:
-            return json.load(open(PROCESSED_PATH))
-        except json.JSONDecodeError:
-            return {}
-    return {}
+processed_store = open_store(table="processed")
+migrate_json(processed_store, PROCESSED_PATH)
+notification_scheduler = NotificationScheduler(
+    open_store(table="pending_notifications"),
+    outcomes=open_store(table="notification_outcomes"),
+)
+pages_watcher = PagesWatcher()
+
+def request_key(data, round_num=None):
+    round_num = data["round"] if round_num is None else round_num
+    return f"{data['email']}::{data['task']}::round{round_num}::nonce{data['nonce']}"
+
+def attachment_key(key, received_at):
+    return f"{key}::{received_at}"
 
-def save_processed(data):
-    json.dump(data, open(PROCESSED_PATH, "w"), indent=2)
+def release_job_attachments(key, data):
+    # A job's attachment view pins its objects against cleanup until the job leaves the journal
+    release_task(attachment_key(key, data.get("received_at")))
+
+job_journal = JobJournal(open_store(table="jobs"), open_store(table="job_stages"), on_remove=release_job_attachments)
+# Request key -> task holding that request's notification until its Pages build is live
+pages_waits = {}
+# Keys of requests between their duplicate checks and being queued
+accepting = set()
 
 def log_notification_result(task_id, result, round_num):
     """Logs the outcome of notification attempts."""
@@ -46,125 +127,303 @@ def log_notification_result(task_id, result, round_num):
 
 
 # === Background task ===
-def process_request(data):
-    request_timestamp = datetime.now().isoformat()
+async def process_request(data):
+    # The 10-minute deadline runs from when the request was received, not dequeued
+    request_timestamp = data.get("received_at") or datetime.now().isoformat()
     round_num = data.get("round", 1)
     task_id = data["task"]
     print(f"⚙ Starting background process for task {task_id} (round {round_num})")
 
+    key = request_key(data, round_num)
+    # Journaled before any work, so a restart resumes the job from its last completed stage
+    stages = await asyncio.to_thread(job_journal.begin, key, data)
+    trace = start_trace(key, task=task_id, round=round_num)
     attachments = data.get("attachments", [])
-    saved_attachments = decode_attachments(attachments)
-    print("Attachments saved:", saved_attachments)
+    try:
+        # The view is kept while the job is journaled, so a resumed job still finds its objects
+        with span("decode_attachments", count=len(attachments)):
+            saved_attachments = await asyncio.to_thread(
+                decode_attachments, attachments, attachment_key(key, request_timestamp)
+            )
+        print("Attachments saved:", saved_attachments)
+        return await _run_pipeline(data, request_timestamp, saved_attachments, key, stages)
+    except BaseException:
+        # Otherwise the trace is written once the notification settles (see _notify)
+        _dump_trace(trace)
+        raise
+    finally:
+        await asyncio.to_thread(cleanup_attachments)
+
 
-    # Optional: fetch previous README for round 2
-    prev_readme = None
+def _dump_trace(trace):
+    trace_path = trace.dump()
+    if trace_path:
+        print(f"🧭 Trace written to {trace_path}")
+
+
+async def _generate(data, saved_attachments, deadline, on_file):
+    """
+    Fetch the previous files in round 2 and generate the app. Returns (gen, repo); repo
+    is only set when it was already looked up for the round-2 context.
+    """
+    round_num = data.get("round", 1)
+    task_id = data["task"]
+    attachments = data.get("attachments", [])
+    checks = data.get("checks", [])
+    repo = None
+
+    # Optional: fetch previous README and index.html for round 2
+    prev_files = {}
     if round_num == 2:
         try:
-            readme = repo.get_contents("README.md")
-            prev_readme = readme.decoded_content.decode("utf-8", errors="ignore")
-            print("📖 Loaded previous README for round 2 context.")
-        except Exception:
-            prev_readme = None
-
-    gen = generate_app_code(
-        data["brief"],
-        attachments=attachments,
-        checks=data.get("checks", []),
-        round_num=round_num,
-        prev_readme=prev_readme
-        )
-    
+            async with stage_limit("github"):
+                with span("fetch_previous"):
+                    repo = await asyncio.to_thread(create_repo, task_id, description=repo_description(data))
+                    prev_files = await asyncio.to_thread(read_files, repo, ["README.md", "index.html"])
+            print(f"📖 Loaded previous {', '.join(prev_files) or 'nothing'} for round 2 context.")
+        except Exception as e:
+            print("⚠ Could not load previous files:", e)
+    prev_readme = prev_files.get("README.md")
+    prev_code = prev_files.get("index.html")
+
+    use_cache = not data.get("no_cache", False)
+    # Cache hits are answered before waiting for an LLM slot; the generate_* functions look
+    # again once the slot is held, as a job generating the same app may have finished meanwhile
+    gen = None
+    incremental = round_num == 2 and prev_code and GEN_INCREMENTAL
+    if use_cache:
+        if incremental:
+            gen = await cached_revision(data["brief"], prev_files, checks, saved_attachments)
+        if gen is None:
+            gen = cached_app_code(data["brief"], checks, round_num, prev_readme, prev_code, saved_attachments)
+    if gen is None and incremental:
+        # Edit the published files in place; None means the edits were unusable
+        async with stage_limit("llm"):
+            gen = await generate_revision(
+                data["brief"],
+                prev_files,
+                attachments=attachments,
+                checks=checks,
+                use_cache=use_cache,
+                saved_attachments=saved_attachments,
+            )
+    if gen is None:
+        async with stage_limit("llm"):
+            if GEN_CANDIDATES > 1 and checks:
+                # Best-of-N with repairs; validated inside, so the repo is prepared after it
+                gen = await generate_best_app_code(
+                    data["brief"],
+                    attachments=attachments,
+                    checks=checks,
+                    round_num=round_num,
+                    prev_readme=prev_readme,
+                    prev_code=prev_code,
+                    use_cache=use_cache,
+                    saved_attachments=saved_attachments,
+                    deadline=deadline,
+                )
+            else:
+                gen = await generate_app_code_async(
+                    data["brief"],
+                    attachments=attachments,
+                    checks=checks,
+                    round_num=round_num,
+                    prev_readme=prev_readme,
+                    prev_code=prev_code,
+                    use_cache=use_cache,
+                    on_file=on_file,
+                    saved_attachments=saved_attachments,
+                )
+    if gen.get("metrics"):
+        print("⏱ Generation metrics:", gen["metrics"])
+    return gen, repo
+
+
+def repo_description(data):
+    return f"Auto-generated app for task: {data['brief']}"
+
+
+async def _run_pipeline(data, request_timestamp, saved_attachments, key, stages):
+    round_num = data.get("round", 1)
+    task_id = data["task"]
+    description = repo_description(data)
+    checks = data.get("checks", [])
+    deadline = datetime.fromisoformat(request_timestamp).timestamp() + NOTIFY_DEADLINE_SECONDS
+    repo = repo_task = None
+
+    async def prepare_repo(html):
+        # Runs while the README is still streaming
+        async with stage_limit("github"):
+            with span("repo_create", early=True):
+                repo = await asyncio.to_thread(create_repo, task_id, description=description)
+                await asyncio.to_thread(ensure_initialized, repo, "index.html", html, f"Round {round_num}: add index.html")
+        return repo
+
+    def on_file(name, content):
+        nonlocal repo_task
+        if name == "index.html" and repo_task is None:
+            repo_task = asyncio.create_task(prepare_repo(content))
+
+    async def record(stage, artifacts):
+        await asyncio.to_thread(job_journal.record, key, stage, artifacts)
+
+    if "generated" in stages:
+        gen = stages["generated"]
+        print(f"📒 Reusing journaled generation for {task_id}")
+    else:
+        gen, repo = await _generate(data, saved_attachments, deadline, on_file)
+        await record("generated", {k: gen[k] for k in ("files", "changed", "validation") if k in gen})
+
     files = gen.get("files", {})
-    saved_info = gen.get("attachments", [])
     
     # Validate checks against generated code
     html_code = files.get("index.html", "")
     readme_content = files.get("README.md", "")
-    checks = data.get("checks", [])
     
-    if checks:
+    if "validated" in stages:
+        data["validation_result"] = stages["validated"]
+    elif checks:
         print("\n🔍 Validating against checks...")
-        validation_result = validate_checks(html_code, readme_content, checks)
+        validation_result = gen.get("validation")
+        if validation_result is None:
+            with span("validation", checks=len(checks)):
+                validation_result = validate_checks(html_code, readme_content, checks)
         checks_report = generate_checks_report(validation_result)
         print(checks_report)
         data["validation_result"] = validation_result
+        await record("validated", validation_result)
     else:
         data["validation_result"] = {"all_passed": True, "score": 100}
+        await record("validated", data["validation_result"])
+
+    if "committed" in stages:
+        committed = stages["committed"]
+    else:
+        committed = await _commit(data, files, gen.get("changed"), saved_attachments, repo, repo_task)
+        await record("committed", committed)
+    commit_sha = committed["commit_sha"]
+
+    # Step 4: Handle GitHub Pages enablement or reuse existing
+    if "pages" in stages:
+        pages_ok, pages_url = stages["pages"]["pages_ok"], stages["pages"]["pages_url"]
+    elif data["round"] == 1:
+        async with stage_limit("github"):
+            with span("enable_pages"):
+                pages_ok = await enable_pages_async(task_id)
+        pages_url = f"https://{USERNAME}.github.io/{task_id}/" if pages_ok else None
+        await record("pages", {"pages_ok": pages_ok, "pages_url": pages_url})
+    else:
+        # For round 2 or later, Pages already exist
+        pages_ok = True
+        pages_url = f"https://{USERNAME}.github.io/{task_id}/"
+        await record("pages", {"pages_ok": pages_ok, "pages_url": pages_url})
 
+    payload = {
+        "email": data["email"],
+        "task": data["task"],
+        "round": round_num,
+        "nonce": data["nonce"],
+        "repo_url": committed["repo_url"],
+        "commit_sha": commit_sha,
+        "pages_url": pages_url,
+    }
+
+    processed_store.put(key, payload)
+
+    # Deliveries run on the scheduler, so the worker is free as soon as they are queued
+    if pages_ok:
+        # Hold the notification until the Pages build for this commit is live, or the deadline is near
+        ready = pages_watcher.watch(task_id, commit_sha, deadline - PAGES_NOTIFY_MARGIN)
+        waiter = asyncio.create_task(_notify_when_live(ready, data, payload, deadline, key))
+        pages_waits[key] = waiter
+        waiter.add_done_callback(lambda _: pages_waits.pop(key, None))
+    else:
+        _notify(data, payload, deadline, key)
+    return payload
 
-    # Step 1: Get or create repo
-    repo = create_repo(task_id, description=f"Auto-generated app for task: {data['brief']}")
 
-    # Step 2: Round-specific logic
+async def _commit(data, files, changed, saved_attachments, repo, repo_task):
+    round_num = data.get("round", 1)
+    task_id = data["task"]
+
+    # Step 1: Get or create repo (already under way if index.html streamed in early)
+    # PyGithub is synchronous, so its calls run off the event loop
+    if repo_task is not None:
+        repo = await repo_task
+    elif repo is None:
+        async with stage_limit("github"):
+            with span("repo_create"):
+                repo = await asyncio.to_thread(create_repo, task_id, description=repo_description(data))
+
+    # Step 2: Collect every file for a single commit
+    publish = {}
     if round_num == 1:
         print("🏗 Round 1: Building fresh repo...")
         # Add attachments
-        for att in saved_info:
+        for att in saved_attachments:
             path = att["name"]
             try:
-                with open(att["path"], "rb") as f:
-                    content_bytes = f.read()
                 if att["mime"].startswith("text") or att["name"].endswith((".md", ".csv", ".json", ".txt")):
-                    text = content_bytes.decode("utf-8", errors="ignore")
-                    create_or_update_file(repo, path, text, f"Add attachment {path}")
+                    with open(att["path"], "r", encoding="utf-8", errors="ignore", newline="") as f:
+                        publish[path] = f.read()
                 else:
-                    create_or_update_binary_file(repo, path, content_bytes, f"Add binary {path}")
-                    b64 = base64.b64encode(content_bytes).decode("utf-8")
-                    create_or_update_file(repo, f"attachments/{att['name']}.b64", b64, f"Backup {att['name']}.b64")
+                    # Reuse the base64 text from the request for both the blob and the backup
+                    with open(att["b64_path"], "r", encoding="ascii") as f:
+                        b64 = f.read()
+                    publish[path] = Base64Blob(b64, att.get("git_sha"))
+                    publish[f"attachments/{att['name']}.b64"] = b64
             except Exception as e:
-                print("⚠ Attachment commit failed:", e)
+                print("⚠ Attachment read failed:", e)
     else:
         print("🔁 Round 2: Revising existing repo...")
-        # For round 2, update existing code and README
-        # Commit new files on top of existing repo
-        for fname, content in files.items():
-            create_or_update_file(repo, fname, content, f"Update {fname} for round 2")
 
-    # Step 3: Common steps for both rounds
-    for fname, content in files.items():
-        create_or_update_file(repo, fname, content, f"Add/Update {fname}")
-
-    mit_text = generate_mit_license()
-    create_or_update_file(repo, "LICENSE", mit_text, "Add MIT license")
-
-    # Step 6: Handle GitHub Pages enablement or reuse existing
-    if data["round"] == 1:
-        pages_ok = enable_pages(task_id)
-        pages_url = f"https://{USERNAME}.github.io/{task_id}/" if pages_ok else None
+    # Step 3: Common files for both rounds; a revision only carries the files it edited
+    if changed is not None:
+        publish.update({path: files[path] for path in changed})
     else:
-        # For round 2 or later, Pages already exist
-        pages_ok = True
-        pages_url = f"https://{USERNAME}.github.io/{task_id}/"
-
-    try:
-        commit_sha = repo.get_commits()[0].sha
-    except Exception:
-        commit_sha = None
+        publish.update(files)
+    publish["LICENSE"] = generate_mit_license()
 
-    payload = {
-        "email": data["email"],
-        "task": data["task"],
-        "round": round_num,
-        "nonce": data["nonce"],
+    async with stage_limit("github"):
+        with span("commit", files=len(publish)):
+            published = await asyncio.to_thread(
+                publish_files, repo, publish, f"Round {round_num}: add/update app for task {task_id}"
+            )
+    print(f"📦 Task {task_id} round {round_num}: {published['written']} files written, {published['skipped']} unchanged")
+    return {
+        "commit_sha": published["commit_sha"],
         "repo_url": repo.html_url,
-        "commit_sha": commit_sha,
-        "pages_url": pages_url,
+        "written": published["written"],
+        "skipped": published["skipped"],
     }
 
-    notify_evaluation_server(data["evaluation_url"], payload)
 
-    processed = load_processed()
-    key = f"{data['email']}::{data['task']}::round{round_num}::nonce{data['nonce']}"
-    processed[key] = payload
-    save_processed(processed)
+def _notify(data, payload, deadline, key=None):
+    # The task's trace follows the delivery, so its notify attempts are recorded in it too
+    trace = current_trace.get()
+    pending = notification_scheduler.deliver(data["evaluation_url"], payload, deadline, trace=trace)
+    pending.add_done_callback(lambda f: log_notification_result(payload["task"], f.result(), payload["round"]))
+    if trace is not None:
+        pending.add_done_callback(lambda f: _dump_trace(trace))
+    if key is not None:
+        # The scheduler persists queued deliveries itself, so the job is complete from here on
+        job_journal.finish(key)
+
+
+async def _notify_when_live(ready, data, payload, deadline, key=None):
+    with span("pages_wait"):
+        pages = await ready
+    if not pages["live"]:
+        print(f"⚠ Notifying for {payload['task']} before Pages is confirmed live ({pages['status']})")
+    _notify(data, payload, deadline, key)
 
-    result = notify_evaluation_server(data.get("evaluation_url"), payload, request_timestamp)
-    log_notification_result(task_id, result, round_num)
+
+job_queue = JobQueue(process_request)
 
 
 # === Main endpoint ===
 @app.post("/api-endpoint")
-async def receive_request(request: Request, background_tasks: BackgroundTasks):
+async def receive_request(request: Request):
     data = await request.json()
     print("📩 Received request:", data)
 
@@ -173,18 +432,85 @@ async def receive_request(request: Request, background_tasks: BackgroundTasks):
         print("❌ Invalid secret received.")
         return {"error": "Invalid secret"}
 
-    processed = load_processed()
-    key = f"{data['email']}::{data['task']}::round{data['round']}::nonce{data['nonce']}"
+    key = request_key(data)
+
+    # Same task/round/nonce already queued or running: share that job
+    if job_queue.attach(key) is not None or key in accepting:
+        print(f"🔗 {key} is already being processed, attaching to the running job")
+        return {"status": "accepted", "note": "attached to in-flight job"}
+
+    # Committed but its notification is held for the Pages build: that notification covers this one
+    if key in pages_waits:
+        print(f"🔗 {key} is waiting for its Pages build, the pending notification covers it")
+        return {"status": "accepted", "note": "attached to in-flight job"}
 
     # Duplicate detection
-    if key in processed:
-        print(f"⚠ Duplicate request detected for {key}. Re-notifying only.")
-        prev = processed[key]
-        notify_evaluation_server(data.get("evaluation_url"), prev)
-        return {"status": "ok", "note": "duplicate handled & re-notified"}
+    prev = processed_store.get(key)
+    if prev is not None:
+        print(f"⚠ Duplicate request detected for {key}. Re-notifying only if not yet delivered.")
+        notification_scheduler.deliver(data.get("evaluation_url"), prev)
+        return {"status": "ok", "note": "duplicate handled"}
 
-    # Schedule background task (non-blocking)
-    background_tasks.add_task(process_request, data)
+    data["received_at"] = datetime.now().isoformat()
+
+    # Duplicates arriving from here until the job is queued attach to it as well
+    accepting.add(key)
+    try:
+        # Attachments go to the object store on receipt, linked into the job's view so they are
+        # not evicted while it waits; the job and its journal entry only carry references
+        if data.get("attachments"):
+            saved = await asyncio.to_thread(
+                decode_attachments, data["attachments"], attachment_key(key, data["received_at"])
+            )
+            data["attachments"] = attachment_refs(saved)
+
+        # Journaled before it is queued, so a worker's begin() always finds the entry
+        await asyncio.to_thread(job_journal.add, key, data)
+
+        # Hand off to the job queue; shed load when it is full
+        if job_queue.submit(data, key=key) is None:
+            await asyncio.to_thread(job_journal.discard, key)
+            print(f"🚦 Job queue full, rejecting {key}")
+            return JSONResponse(
+                status_code=503,
+                content={"status": "busy", "note": "job queue full, retry later"},
+                headers={"Retry-After": str(QUEUE_RETRY_AFTER)},
+            )
+    except BaseException:
+        # Never queued, so nothing else will release the attachment view
+        release_job_attachments(key, data)
+        raise
+    finally:
+        accepting.discard(key)
 
     # Immediate HTTP 200 acknowledgment
     return {"status": "accepted", "note": f"processing round {data['round']} started"}
+
+
+def collect_stats():
+    return {
+        "jobs": job_queue.stats(),
+        "journal": job_journal.stats(),
+        "generation_cache": generation_cache.stats(),
+        "generation": get_generation_stats(),
+        "templates": get_render_stats(),
+        "llm": llm_router.stats(),
+        "attachments": get_store_stats(),
+        "http": pool_stats(),
+        "github": github_client.stats(),
+        "publish": get_publish_stats(),
+        "github_metadata": metadata_cache.stats(),
+        "notifications": notification_scheduler.stats(),
+        "pages": pages_watcher.stats(),
+    }
+
+
+@app.get("/stats")
+async def stats():
+    return collect_stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus text format: stage latency histograms plus the /stats counters as gauges
+    return PlainTextResponse(render_prometheus(collect_stats()), media_type="text/plain; version=0.0.4")
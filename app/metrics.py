@@ -0,0 +1,149 @@
+# app/metrics.py
+import os
+import json
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+# Directory for per-task JSON trace dumps; unset disables them
+TRACE_DIR = os.getenv("TRACE_DIR")
+
+_lock = threading.Lock()
+_histograms = {}
+current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+
+def observe(stage: str, seconds: float) -> None:
+    """Record one duration for a pipeline stage."""
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = Histogram()
+        hist.observe(seconds)
+
+
+class Trace:
+    """
+    Spans recorded for one task. Activate it with start_trace(); span() then
+    attaches to it from anywhere in the task, including worker threads
+    started with asyncio.to_thread.
+    """
+
+    def __init__(self, name: str, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started = time.time()
+        self.spans = []
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "attrs": self.attrs,
+            "started": self.started,
+            "total_seconds": round(time.time() - self.started, 4),
+            "spans": list(self.spans),
+        }
+
+    def dump(self, directory: str = None):
+        directory = directory or TRACE_DIR
+        if not directory:
+            return None
+        os.makedirs(directory, exist_ok=True)
+        safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in self.name)
+        path = os.path.join(directory, f"{safe_name}_{int(self.started)}.json")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+
+def start_trace(name: str, **attrs) -> Trace:
+    trace = Trace(name, **attrs)
+    current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """
+    Time a block as `stage`: feeds the stage histogram and the current task trace.
+    """
+    start = time.time()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        duration = time.time() - start
+        observe(stage, duration)
+        trace = current_trace.get()
+        if trace is not None:
+            record = {"stage": stage, "start": round(start - trace.started, 4), "seconds": round(duration, 4)}
+            if attrs:
+                record["attrs"] = attrs
+            if error:
+                record["error"] = error
+            trace.spans.append(record)
+
+
+def _format_bound(bound) -> str:
+    return str(float(bound)) if bound != int(bound) else f"{int(bound)}.0"
+
+
+def _flatten(prefix: str, value, out: list):
+    if isinstance(value, bool):
+        out.append((prefix, int(value)))
+    elif isinstance(value, (int, float)):
+        out.append((prefix, value))
+    elif isinstance(value, dict):
+        for key, sub in value.items():
+            _flatten(f"{prefix}_{key}", sub, out)
+
+
+def render_prometheus(gauges: dict = None) -> str:
+    """
+    Prometheus text exposition of the stage histograms, plus every numeric
+    value in `gauges` (nested dicts are flattened into metric names).
+    """
+    lines = [
+        "# HELP task_stage_seconds Latency of task pipeline stages",
+        "# TYPE task_stage_seconds histogram",
+    ]
+    with _lock:
+        for stage in sorted(_histograms):
+            hist = _histograms[stage]
+            cumulative = 0
+            for bound, count in zip(hist.buckets, hist.counts):
+                cumulative += count
+                lines.append(f'task_stage_seconds_bucket{{stage="{stage}",le="{_format_bound(bound)}"}} {cumulative}')
+            lines.append(f'task_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {hist.count}')
+            lines.append(f'task_stage_seconds_sum{{stage="{stage}"}} {hist.sum:.6f}')
+            lines.append(f'task_stage_seconds_count{{stage="{stage}"}} {hist.count}')
+
+    flat = []
+    _flatten("app", gauges or {}, flat)
+    for name, value in flat:
+        name = "".join(c if c.isalnum() or c == "_" else "_" for c in name)
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {value}")
+    return "\n".join(lines) + "\n"
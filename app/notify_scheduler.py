@@ -0,0 +1,237 @@
+# app/notify_scheduler.py
+import os
+import json
+import time
+import uuid
+import heapq
+import hashlib
+import random
+import asyncio
+import itertools
+
+from app.http_clients import get_async_client
+from app.jobs import stage_limit
+from app.notify import HEADERS, notify_result, attempt_error
+from app.metrics import span, current_trace
+
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "5"))
+NOTIFY_BASE_DELAY = float(os.getenv("NOTIFY_BASE_DELAY", "1"))
+NOTIFY_MAX_DELAY = float(os.getenv("NOTIFY_MAX_DELAY", "16"))
+NOTIFY_DEADLINE_SECONDS = 10 * 60
+
+
+def delivery_key(payload: dict) -> str:
+    """Idempotency key of a notification: one delivery per email/task/round/nonce."""
+    return f"{payload.get('email')}::{payload.get('task')}::round{payload.get('round')}::nonce{payload.get('nonce')}"
+
+
+def _payload_digest(payload: dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class NotificationScheduler:
+    """
+    Delivers evaluation notifications from a timer heap on the event loop.
+
+    Each delivery is retried with full-jitter exponential backoff, and no retry
+    is scheduled past its deadline. Pending deliveries are persisted in `store`
+    and picked up again by start() after a restart. When an `outcomes` store is
+    given, deliver() records final outcomes and makes sends idempotent.
+    """
+
+    def __init__(self, store, outcomes=None):
+        self.store = store
+        self.outcomes = outcomes
+        self._heap = []
+        self._seq = itertools.count()
+        self._pending = {}
+        self._futures = {}
+        # Task traces notify spans are recorded in; not persisted across restarts
+        self._traces = {}
+        self._wakeup = None
+        self._task = None
+        self._inflight = set()
+        self.delivered = 0
+        self.failed = 0
+        self.retries = 0
+        self.coalesced = 0
+        self.skipped = 0
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        for delivery_id, delivery in self.store.items():
+            self._pending[delivery_id] = delivery
+            self._push(delivery_id, time.time())
+        if self._pending:
+            print(f"📬 Resuming {len(self._pending)} pending notifications")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        for task in list(self._inflight):
+            task.cancel()
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+
+    def submit(self, evaluation_url: str, payload: dict, deadline: float = None, delivery_id: str = None,
+               trace=None) -> asyncio.Future:
+        """
+        Queue a notification and return immediately.
+        The returned future resolves to a notify_result() dict.
+        `deadline` is an epoch timestamp; it defaults to 10 minutes from now.
+        Attempts are recorded as "notify" spans in `trace` when one is given.
+        """
+        delivery_id = delivery_id or uuid.uuid4().hex
+        delivery = {
+            "url": evaluation_url,
+            "payload": payload,
+            "deadline": deadline or time.time() + NOTIFY_DEADLINE_SECONDS,
+            "attempts": 0,
+            "started": time.time(),
+            "last_status": None,
+            "last_error": None,
+        }
+        future = asyncio.get_running_loop().create_future()
+        self._futures[delivery_id] = future
+        if trace is not None:
+            self._traces[delivery_id] = trace
+        self._pending[delivery_id] = delivery
+        self.store.put(delivery_id, delivery)
+        self._push(delivery_id, time.time())
+        return future
+
+    def deliver(self, evaluation_url: str, payload: dict, deadline: float = None, trace=None) -> asyncio.Future:
+        """
+        Idempotent submit keyed by delivery_key(payload).
+
+        A send already in flight for the key is shared instead of duplicated, and a
+        payload that was already delivered successfully is not sent again; only a
+        failed or changed delivery is re-sent.
+        """
+        key = delivery_key(payload)
+        loop = asyncio.get_running_loop()
+
+        if key in self._pending:
+            self.coalesced += 1
+            print(f"🔗 Notification for {key} already in flight, sharing it")
+            if trace is not None:
+                self._traces.setdefault(key, trace)
+            future = self._futures.get(key)
+            if future is None:
+                # Resumed after a restart; nobody was waiting on it yet
+                future = self._futures[key] = loop.create_future()
+            return future
+
+        previous = self.outcomes.get(key) if self.outcomes is not None else None
+        if previous and previous["result"]["success"] and previous["digest"] == _payload_digest(payload):
+            self.skipped += 1
+            print(f"📭 Notification for {key} already delivered, not re-sending")
+            future = loop.create_future()
+            future.set_result(previous["result"])
+            return future
+
+        return self.submit(evaluation_url, payload, deadline, delivery_id=key, trace=trace)
+
+    def _push(self, delivery_id: str, due: float):
+        heapq.heappush(self._heap, (due, next(self._seq), delivery_id))
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            while self._heap:
+                due, _, delivery_id = self._heap[0]
+                if due > time.time():
+                    timeout = due - time.time()
+                    break
+                heapq.heappop(self._heap)
+                task = asyncio.create_task(self._attempt(delivery_id))
+                self._inflight.add(task)
+                task.add_done_callback(self._inflight.discard)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _attempt(self, delivery_id: str):
+        delivery = self._pending.get(delivery_id)
+        if delivery is None:
+            return
+        remaining = delivery["deadline"] - time.time()
+        if remaining <= 0:
+            self._finish(delivery_id, notify_result(
+                False, delivery["attempts"], time.time() - delivery["started"], 408,
+                delivery["last_error"] or "Request exceeded 10-minute deadline"))
+            return
+
+        attempt = delivery["attempts"]
+        delivery["attempts"] += 1
+        trace = self._traces.get(delivery_id)
+        if trace is not None:
+            # Only this attempt's task context sees it
+            current_trace.set(trace)
+        try:
+            print(f"📤 Notification attempt {attempt + 1}/{NOTIFY_MAX_ATTEMPTS} to {delivery['url']}")
+            async with stage_limit("notify"):
+                with span("notify", attempt=attempt + 1):
+                    r = await get_async_client().post(
+                        delivery["url"], headers=HEADERS, json=delivery["payload"], timeout=min(10.0, remaining)
+                    )
+            delivery["last_status"] = r.status_code
+            if r.status_code == 200:
+                print(f"✅ Evaluation server notified successfully (attempt {attempt + 1}).")
+                self._finish(delivery_id, notify_result(
+                    True, attempt + 1, time.time() - delivery["started"], 200, None))
+                return
+            delivery["last_error"] = f"HTTP {r.status_code}: {r.text[:200]}"
+            print(f"⚠️ Attempt {attempt + 1}: Server responded {r.status_code}")
+        except Exception as e:
+            delivery["last_error"] = attempt_error(attempt, e)
+
+        remaining = delivery["deadline"] - time.time()
+        if delivery["attempts"] >= NOTIFY_MAX_ATTEMPTS or remaining <= 0:
+            print(f"❌ Failed to notify evaluation server after {delivery['attempts']} attempts.")
+            self._finish(delivery_id, notify_result(
+                False, delivery["attempts"], time.time() - delivery["started"],
+                delivery["last_status"], delivery["last_error"]))
+            return
+
+        # Full jitter, capped by the backoff ceiling and the time left before the deadline
+        delay = min(random.uniform(0, NOTIFY_BASE_DELAY * 2 ** attempt), NOTIFY_MAX_DELAY, remaining)
+        print(f"⏳ Retrying notification in {delay:.1f}s ({remaining:.0f}s to deadline)")
+        self.retries += 1
+        self.store.put(delivery_id, delivery)
+        self._push(delivery_id, time.time() + delay)
+
+    def _finish(self, delivery_id: str, result: dict):
+        delivery = self._pending.pop(delivery_id, None)
+        self._traces.pop(delivery_id, None)
+        self.store.delete(delivery_id)
+        if self.outcomes is not None and delivery is not None:
+            self.outcomes.put(delivery_key(delivery["payload"]), {
+                "result": result,
+                "digest": _payload_digest(delivery["payload"]),
+            })
+        if result["success"]:
+            self.delivered += 1
+        else:
+            self.failed += 1
+        future = self._futures.pop(delivery_id, None)
+        if future is not None and not future.done():
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "scheduled": len(self._heap),
+            "in_flight": len(self._inflight),
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retries": self.retries,
+            "coalesced": self.coalesced,
+            "skipped_already_delivered": self.skipped,
+        }
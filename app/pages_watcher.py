@@ -0,0 +1,161 @@
+# app/pages_watcher.py
+import os
+import time
+import asyncio
+
+from app.http_clients import get_async_client
+from app.github_utils import pages_api_url, api_headers
+from app.metrics import span
+
+PAGES_POLL_INTERVAL = float(os.getenv("PAGES_POLL_INTERVAL", "3"))
+PAGES_POLL_MAX_INTERVAL = float(os.getenv("PAGES_POLL_MAX_INTERVAL", "20"))
+# Status requests in flight at once across all watched repos
+PAGES_POLL_CONCURRENCY = int(os.getenv("PAGES_POLL_CONCURRENCY", "8"))
+# Stop waiting this many seconds before the notification deadline and notify anyway
+PAGES_NOTIFY_MARGIN = float(os.getenv("PAGES_NOTIFY_MARGIN", "60"))
+
+
+class PagesWatcher:
+    """
+    Waits for GitHub Pages builds to finish before a site is announced.
+
+    One loop polls `GET /repos/{owner}/{repo}/pages/builds/latest` for every
+    watched repo whose next poll is due, in a single concurrent batch. Each
+    repo backs off from PAGES_POLL_INTERVAL up to PAGES_POLL_MAX_INTERVAL while
+    its build is pending. A watch resolves as live once the latest build is
+    "built" for the expected commit, and as not live when the build errors or
+    its deadline passes. Watches for the same repo and commit are shared.
+    """
+
+    def __init__(self, interval: float = PAGES_POLL_INTERVAL, max_interval: float = PAGES_POLL_MAX_INTERVAL,
+                 concurrency: int = PAGES_POLL_CONCURRENCY):
+        self.interval = interval
+        self.max_interval = max_interval
+        self.concurrency = concurrency
+        self._watches = {}
+        self._wakeup = None
+        self._semaphore = None
+        self._task = None
+        self.polls = 0
+        self.batches = 0
+        self.live = 0
+        self.timed_out = 0
+        self.errored = 0
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        # Release every waiter so pending notifications still go out
+        for key in list(self._watches):
+            self._resolve(key, False, "shutdown")
+
+    def watch(self, repo_name: str, commit_sha: str = None, deadline: float = None) -> asyncio.Future:
+        """
+        Start watching the Pages build of `repo_name` and return a future resolving to
+        {"live", "status", "waited"}. `deadline` is an epoch timestamp after which the
+        watch gives up; it defaults to 10 minutes from now.
+        """
+        key = (repo_name, commit_sha)
+        watch = self._watches.get(key)
+        if watch is None:
+            now = time.time()
+            watch = self._watches[key] = {
+                "started": now,
+                "deadline": deadline or now + 600,
+                "delay": self.interval,
+                "next_poll": now + self.interval,
+                "status": None,
+                "future": asyncio.get_running_loop().create_future(),
+            }
+            if self._wakeup is not None:
+                self._wakeup.set()
+        elif deadline is not None:
+            watch["deadline"] = min(watch["deadline"], deadline)
+        return watch["future"]
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            for key, watch in list(self._watches.items()):
+                if watch["deadline"] <= now:
+                    self._resolve(key, False, watch["status"] or "timeout")
+            due = [key for key, watch in self._watches.items() if watch["next_poll"] <= now]
+            if due:
+                self.batches += 1
+                with span("pages_poll", repos=len(due)):
+                    await asyncio.gather(*(self._poll(key) for key in due))
+            timeout = None
+            if self._watches:
+                wake_at = min(min(w["next_poll"], w["deadline"]) for w in self._watches.values())
+                timeout = max(wake_at - time.time(), 0)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, key):
+        repo_name, commit_sha = key
+        watch = self._watches.get(key)
+        if watch is None:
+            return
+        try:
+            async with self._semaphore:
+                self.polls += 1
+                r = await get_async_client().get(
+                    f"{pages_api_url(repo_name)}/builds/latest", headers=api_headers(), timeout=10.0
+                )
+            if r.status_code == 200:
+                build = r.json()
+                watch["status"] = build.get("status")
+                build_commit = build.get("commit")
+                if watch["status"] == "built" and (commit_sha is None or build_commit in (None, commit_sha)):
+                    self._resolve(key, True, "built")
+                    return
+                if watch["status"] == "errored" and (commit_sha is None or build_commit == commit_sha):
+                    self._resolve(key, False, "errored")
+                    return
+                if watch["status"] == "built":
+                    # The site is up but still serves an older commit
+                    watch["status"] = "built (previous commit)"
+            else:
+                # 404 until the first build has been queued
+                watch["status"] = f"HTTP {r.status_code}"
+        except Exception as e:
+            watch["status"] = f"error: {e}"
+        watch["next_poll"] = time.time() + watch["delay"]
+        watch["delay"] = min(watch["delay"] * 2, self.max_interval)
+
+    def _resolve(self, key, live: bool, status: str):
+        watch = self._watches.pop(key, None)
+        if watch is None:
+            return
+        waited = round(time.time() - watch["started"], 1)
+        if live:
+            self.live += 1
+            print(f"🌐 Pages for {key[0]} live after {waited}s")
+        elif status == "errored":
+            self.errored += 1
+            print(f"❌ Pages build for {key[0]} errored after {waited}s")
+        else:
+            self.timed_out += 1
+            print(f"⌛ Stopped waiting for Pages of {key[0]} after {waited}s (last status: {status})")
+        if not watch["future"].done():
+            watch["future"].set_result({"live": live, "status": status, "waited": waited})
+
+    def stats(self) -> dict:
+        return {
+            "watching": len(self._watches),
+            "polls": self.polls,
+            "batches": self.batches,
+            "live": self.live,
+            "timed_out": self.timed_out,
+            "errored": self.errored,
+        }
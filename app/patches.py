@@ -0,0 +1,135 @@
+# app/patches.py
+import re
+from dataclasses import dataclass
+
+SEARCH_MARKER = "<<<<<<< SEARCH"
+DIVIDER = "======="
+REPLACE_MARKER = ">>>>>>> REPLACE"
+
+# "FILE: README.md", optionally as a heading, list item or inside backticks
+_FILE_LINE = re.compile(r"^[#>*\-\s`]*FILE:\s*`?([^\s`]+)`?\s*$", re.I)
+
+
+class PatchError(Exception):
+    """Edit blocks that could not be parsed or do not apply to the current files."""
+
+
+@dataclass
+class Edit:
+    path: str
+    search: str
+    replace: str
+
+
+def parse_edits(text: str, default_path: str = "index.html") -> list:
+    """
+    Parse SEARCH/REPLACE edit blocks from model output:
+
+        FILE: index.html
+        <<<<<<< SEARCH
+        lines copied from the current file
+        =======
+        replacement lines
+        >>>>>>> REPLACE
+
+    A block applies to the file named by the closest FILE: line above it, or to
+    `default_path`. Anything outside blocks (fences, stray prose) is ignored.
+    """
+    edits = []
+    path = default_path
+    search = replace = None
+    for line in (text or "").splitlines():
+        marker = line.strip()
+        if search is None:
+            if marker == SEARCH_MARKER:
+                search = []
+                continue
+            match = _FILE_LINE.match(line)
+            if match:
+                path = match.group(1)
+        elif replace is None:
+            if marker == DIVIDER:
+                replace = []
+            else:
+                search.append(line)
+        elif marker == REPLACE_MARKER:
+            edits.append(Edit(_safe_path(path), "\n".join(search), "\n".join(replace)))
+            search = replace = None
+        else:
+            replace.append(line)
+    if search is not None:
+        raise PatchError(f"unterminated edit block for {path}")
+    return edits
+
+
+def _safe_path(path: str) -> str:
+    path = path.strip()
+    if path.startswith("./"):
+        path = path[2:]
+    if not path or path.startswith("/") or ".." in path.split("/"):
+        raise PatchError(f"refusing to edit {path!r}")
+    return path
+
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+
+def _line_matches(lines: list, wanted: list, normalize) -> list:
+    wanted = [normalize(line) for line in wanted]
+    return [
+        i for i in range(len(lines) - len(wanted) + 1)
+        if all(normalize(lines[i + j]) == wanted[j] for j in range(len(wanted)))
+    ]
+
+
+def _apply(text: str, edit: Edit) -> str:
+    if not edit.search.strip():
+        # An empty SEARCH appends
+        return text.rstrip("\n") + "\n\n" + edit.replace.strip("\n") + "\n"
+
+    # Whole lines first: a SEARCH that is only part of a line would otherwise match inside it,
+    # and the line's own indentation would end up in front of the replacement's.
+    # Models often get indentation or trailing spaces wrong, so those are ignored next.
+    lines = text.split("\n")
+    search = edit.search.strip("\n").split("\n")
+    replace = edit.replace.strip("\n").split("\n")
+    starts = _line_matches(lines, search, lambda line: line)
+    if len(starts) != 1:
+        starts = _line_matches(lines, search, str.strip)
+        if len(starts) == 1:
+            indent = _indent(lines[starts[0]])
+            if indent and not _indent(search[0]) and not _indent(replace[0]):
+                # Indentation left out of both SEARCH and REPLACE: keep the file's
+                replace = [indent + line if line.strip() else line for line in replace]
+    if len(starts) == 1:
+        start = starts[0]
+        return "\n".join(lines[:start] + replace + lines[start + len(search):])
+
+    # Then part of a line, e.g. one attribute
+    count = text.count(edit.search)
+    if count == 1 and not starts:
+        return text.replace(edit.search, edit.replace, 1)
+    if count > 1 or starts:
+        raise PatchError(f"{edit.path}: SEARCH block matches {max(count, len(starts))} places")
+    raise PatchError(f"{edit.path}: SEARCH block not found: {edit.search.strip()[:80]!r}")
+
+
+def apply_edits(files: dict, edits: list) -> dict:
+    """
+    Apply edits in order and return the updated {path: text}; `files` is not modified.
+    Raises PatchError if any edit does not apply or names a path outside `files`, so a
+    patch is used whole or not at all.
+    """
+    out = dict(files)
+    for edit in edits:
+        current = out.get(edit.path)
+        if current is None:
+            # Only the given files are edited; a new path (e.g. a workflow file) is never created
+            raise PatchError(f"{edit.path}: only {', '.join(sorted(files))} can be edited")
+        out[edit.path] = _apply(current, edit)
+    return out
+
+
+def changed_paths(before: dict, after: dict) -> list:
+    return sorted(path for path, text in after.items() if before.get(path) != text)
@@ -0,0 +1,154 @@
+# app/prompt_budget.py
+import os
+import re
+
+# Upper bound for the user prompt, in estimated tokens
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "12000"))
+# Rough average for English text and markup; avoids a count_tokens API round trip
+CHARS_PER_TOKEN = 4
+# Sections left with less room than this are dropped instead of truncated to a stub
+MIN_SECTION_TOKENS = 50
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text or "") + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to about max_tokens, keeping the beginning and the end.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    marker = "\n…[truncated {} chars]…\n"
+    room = max(max_tokens * CHARS_PER_TOKEN - len(marker) - 8, 0)
+    head = room * 2 // 3
+    tail = room - head
+    cut = len(text) - head - tail
+    return text[:head] + marker.format(cut) + (text[-tail:] if tail else "")
+
+
+def _strip_tags(html: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"<[^>]+>", "", html)).strip()
+
+
+def _unique(items, limit):
+    seen = []
+    for item in items:
+        if item and item not in seen:
+            seen.append(item)
+        if len(seen) >= limit:
+            break
+    return seen
+
+
+def code_digest(html: str) -> str:
+    """
+    Compact structural outline of an HTML app: title, headings, element ids, controls,
+    external resources and the names of script functions and event handlers.
+    """
+    if not html:
+        return ""
+    lines = [f"Size: {len(html)} chars, {html.count(chr(10)) + 1} lines"]
+
+    title = re.search(r"<title[^>]*>(.*?)</title>", html, re.I | re.S)
+    if title:
+        lines.append(f"Title: {_strip_tags(title.group(1))}")
+
+    headings = _unique(
+        (f"{m.group(1).lower()}: {_strip_tags(m.group(2))[:80]}"
+         for m in re.finditer(r"<(h[1-3])[^>]*>(.*?)</\1>", html, re.I | re.S)),
+        20,
+    )
+    if headings:
+        lines.append("Headings: " + "; ".join(headings))
+
+    ids = _unique(re.findall(r"""\bid\s*=\s*["']([^"']+)["']""", html, re.I), 60)
+    if ids:
+        lines.append("Element ids: " + ", ".join(f"#{i}" for i in ids))
+
+    controls = _unique(
+        (re.sub(r"\s+", " ", m.group(0))[:100]
+         for m in re.finditer(r"<(?:input|select|textarea|button|form)\b[^>]*>", html, re.I)),
+        30,
+    )
+    if controls:
+        lines.append("Controls: " + " ".join(controls))
+
+    resources = _unique(
+        re.findall(r"""<(?:script|link|img)\b[^>]*?(?:src|href)\s*=\s*["']([^"']+)["']""", html, re.I), 20
+    )
+    if resources:
+        lines.append("External resources: " + ", ".join(resources))
+
+    scripts = " ".join(re.findall(r"<script\b[^>]*>(.*?)</script>", html, re.I | re.S))
+    functions = _unique(
+        re.findall(r"\bfunction\s+([A-Za-z_$][\w$]*)|\b(?:const|let|var)\s+([A-Za-z_$][\w$]*)\s*=\s*(?:async\s*)?(?:function|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)", scripts),
+        40,
+    )
+    names = _unique((a or b for a, b in functions), 40)
+    if names:
+        lines.append("Script functions: " + ", ".join(names))
+
+    events = _unique(re.findall(r"""addEventListener\(\s*["']([\w:-]+)["']""", scripts), 20)
+    if events:
+        lines.append("Event listeners: " + ", ".join(events))
+
+    fetches = _unique(re.findall(r"""fetch\(\s*[`"']([^`"']+)[`"']""", scripts), 10)
+    if fetches:
+        lines.append("Fetches: " + ", ".join(fetches))
+    return "\n".join(lines)
+
+
+def markdown_outline(text: str) -> str:
+    """
+    Headings of a markdown document with the first line under each one.
+    """
+    if not text:
+        return ""
+    outline = []
+    take_next = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            outline.append(stripped)
+            take_next = True
+        elif take_next and stripped:
+            outline.append(stripped[:200])
+            take_next = False
+    return "\n".join(outline)
+
+
+def fit_sections(fixed_tokens: int, sections: list, budget: int = PROMPT_TOKEN_BUDGET):
+    """
+    Fill the room left after `fixed_tokens` with optional sections in priority order.
+
+    `sections` is a list of (name, [variants], share) from most to least important;
+    each variant is a progressively shorter rendering of the same content and
+    `share` caps the section at that fraction of the optional room, so one large
+    input cannot starve the rest. The first variant that fits is used, otherwise
+    the shortest one is truncated. Returns ({name: text}, report).
+    """
+    room = remaining = max(budget - fixed_tokens, 0)
+    chosen = {}
+    report = {"budget": budget, "sections": {}, "truncated": [], "dropped": []}
+    for name, variants, share in sections:
+        variants = [v for v in variants if v]
+        if not variants:
+            chosen[name] = ""
+            continue
+        limit = min(remaining, int(room * share))
+        text = next((v for v in variants if estimate_tokens(v) <= limit), None)
+        if text is None:
+            if limit < MIN_SECTION_TOKENS:
+                chosen[name] = ""
+                report["dropped"].append(name)
+                continue
+            text = truncate_to_tokens(variants[-1], limit)
+            report["truncated"].append(name)
+        elif text is not variants[0]:
+            report["truncated"].append(name)
+        chosen[name] = text
+        report["sections"][name] = estimate_tokens(text)
+        remaining -= estimate_tokens(text)
+    return chosen, report
@@ -0,0 +1,81 @@
+# app/skeletons.py
+import re
+import hashlib
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+TEMPLATE_DIR = Path(__file__).parent / "templates"
+# Rendered outputs kept per (template, brief hash, round, other fields)
+RENDER_CACHE_SIZE = 256
+
+_FIELD = re.compile(r"\{\{(\w+)\}\}")
+
+
+class Skeleton:
+    """
+    A text template with {{field}} placeholders, split into literal and field parts
+    once so rendering is a single join. Other braces are left alone, so code samples
+    and shell snippets in templates need no escaping.
+    """
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        pieces = _FIELD.split(text)
+        # Even indexes are literals, odd indexes are field names
+        self.literals = pieces[0::2]
+        self.fields = pieces[1::2]
+
+    def render(self, **values) -> str:
+        out = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            out.append(str(values[field]))
+            out.append(literal)
+        return "".join(out)
+
+
+def _load_all() -> dict:
+    return {path.stem: Skeleton(path.stem, path.read_text(encoding="utf-8"))
+            for path in sorted(TEMPLATE_DIR.iterdir()) if path.is_file()}
+
+
+# Parsed once at import; every render afterwards is substitution only
+SKELETONS = _load_all()
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def render(name: str, **values) -> str:
+    return SKELETONS[name].render(**values)
+
+
+def render_cached(name: str, brief: str, round_num: int, **values) -> str:
+    """
+    render() memoized per (template, brief hash, round, remaining values).
+    The brief is available to the template as {{brief}} and the round as {{round}}.
+    """
+    key = (
+        name,
+        hashlib.sha256(brief.encode("utf-8")).hexdigest(),
+        round_num,
+        tuple(sorted((k, str(v)) for k, v in values.items())),
+    )
+    with _cache_lock:
+        text = _cache.get(key)
+        if text is not None:
+            _cache.move_to_end(key)
+            cache_stats["hits"] += 1
+            return text
+    text = render(name, brief=brief, round=round_num, **values)
+    with _cache_lock:
+        cache_stats["misses"] += 1
+        _cache[key] = text
+        if len(_cache) > RENDER_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return text
+
+
+def get_render_stats() -> dict:
+    return {"templates": len(SKELETONS), "cached": len(_cache), **cache_stats}
@@ -0,0 +1,140 @@
+# app/store.py
+import os
+import json
+import sqlite3
+import threading
+
+
+class MemoryStore:
+    """
+    In-process key/value store. Useful for local development and tests.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteStore:
+    """
+    Persistent key/value store backed by SQLite in WAL mode.
+
+    Lookups go through the primary-key index and every put is a single atomic
+    upsert, so concurrent background tasks never overwrite each other's keys.
+    Values are stored as JSON.
+    """
+
+    def __init__(self, path: str, table: str = "kv"):
+        self.path = path
+        self.table = table
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+
+    def _conn(self):
+        # One connection per thread; WAL lets readers proceed while a writer commits
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key, default=None):
+        row = self._conn().execute(
+            f"SELECT value FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        return json.loads(row[0]) if row else default
+
+    def put(self, key, value):
+        self._conn().execute(
+            f"INSERT INTO {self.table} (key, value) VALUES (?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, json.dumps(value)),
+        )
+
+    def put_many(self, items):
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                f"INSERT INTO {self.table} (key, value) VALUES (?, ?) "
+                f"ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                [(k, json.dumps(v)) for k, v in items],
+            )
+
+    def delete(self, key):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def items(self):
+        rows = self._conn().execute(f"SELECT key, value FROM {self.table}").fetchall()
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def __contains__(self, key):
+        row = self._conn().execute(
+            f"SELECT 1 FROM {self.table} WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self._conn().execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+
+def migrate_json(store, json_path: str) -> int:
+    """
+    Import a legacy {key: payload} JSON file into the store, then rename it so it
+    is only migrated once. Returns the number of imported keys.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    try:
+        with open(json_path) as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"⚠️ Could not migrate {json_path}: {e}")
+        return 0
+
+    if hasattr(store, "put_many"):
+        store.put_many(data.items())
+    else:
+        for key, value in data.items():
+            store.put(key, value)
+    os.replace(json_path, json_path + ".migrated")
+    print(f"📦 Migrated {len(data)} processed requests from {json_path}")
+    return len(data)
+
+
+def open_store(table: str = "kv"):
+    """
+    Build the configured store. PROCESSED_STORE selects the backend
+    ("sqlite" by default, or "memory"); PROCESSED_DB_PATH sets the SQLite file.
+    """
+    backend = os.getenv("PROCESSED_STORE", "sqlite").lower()
+    if backend == "memory":
+        return MemoryStore()
+    path = os.getenv("PROCESSED_DB_PATH", "/tmp/processed_requests.db")
+    return SQLiteStore(path, table=table)
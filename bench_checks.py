@@ -0,0 +1,105 @@
+"""
+Checks-validator microbenchmark: validate_checks time against document size and check count.
+
+    python bench_checks.py
+
+Builds a generated-looking page of each size in BENCH_SIZES_MB (default 0.5,1,2,4) and
+validates BENCH_CHECKS (default 300) mixed checks against it: README, page, js: and
+generic keyword checks. Each run is the median of BENCH_REPEATS. For comparison, the
+per-check rescan the validator used to do (lowercasing html + README for every
+generic check) is timed up to BENCH_RESCAN_MAX_MB. Fails (exit 1) when the time per MB
+at the largest size is more than BENCH_MAX_GROWTH (default 2) times the one at the
+smallest, i.e. when validation stops being near-linear in document size.
+"""
+import os
+import sys
+import time
+import random
+import statistics
+
+from app.checks_validator import validate_checks, extract_keywords
+
+BENCH_SIZES_MB = [float(n) for n in os.getenv("BENCH_SIZES_MB", "0.5,1,2,4").split(",")]
+BENCH_CHECKS = int(os.getenv("BENCH_CHECKS", "300"))
+BENCH_REPEATS = int(os.getenv("BENCH_REPEATS", "3"))
+BENCH_RESCAN_MAX_MB = float(os.getenv("BENCH_RESCAN_MAX_MB", "1"))
+BENCH_MAX_GROWTH = float(os.getenv("BENCH_MAX_GROWTH", "2"))
+
+WORDS = ("counter", "button", "display", "results", "filter", "export", "chart", "upload",
+         "captcha", "solver", "markdown", "preview", "github", "sales", "summary", "currency")
+
+
+def document(size_mb: float, rng: random.Random) -> str:
+    block = (
+        '<div class="card" id="card-{n}"><h2>{a} {b}</h2><p>{a} {b} {c} item {n}</p>'
+        '<button onclick="update{n}()">{c}</button></div>\n'
+        "<script>function update{n}() {{ document.querySelector('#card-{n}').textContent = '{a}'; }}</script>\n"
+    )
+    parts, size, n = ["<!DOCTYPE html><html><head><title>Bench</title></head><body>\n"], 0, 0
+    while size < size_mb * 1024 * 1024:
+        part = block.format(n=n, a=rng.choice(WORDS), b=rng.choice(WORDS), c=rng.choice(WORDS))
+        parts.append(part)
+        size += len(part)
+        n += 1
+    parts.append("<script>const params = new URLSearchParams(location.search);</script></body></html>")
+    return "".join(parts)
+
+
+def checks(count: int, rng: random.Random) -> list:
+    templates = (
+        "README.md contains overview", "README.md is professional", "Page displays captcha URL",
+        "Page loads data", "js: document.title === 'Bench'", "js: !!document.querySelector('#card-1')",
+        "js: fetch('/api') is called", "Has a {a} for the {b}", "Shows {a} {b} and {c}",
+        "Supports {a} with missingword{n}",
+    )
+    return [rng.choice(templates).format(a=rng.choice(WORDS), b=rng.choice(WORDS), c=rng.choice(WORDS), n=i)
+            for i in range(count)]
+
+
+def rescan(html: str, readme: str, check_list: list) -> None:
+    # The pre-index approach: concatenate and lowercase both documents for every generic check
+    for check in check_list:
+        keywords = extract_keywords(check)
+        content = (html + " " + readme).lower()
+        sum(1 for kw in keywords if kw in content)
+
+
+def median_seconds(fn) -> float:
+    samples = []
+    for _ in range(BENCH_REPEATS):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+
+def main():
+    rng = random.Random(1234)
+    readme = "# Bench\n\n## Overview\nBench app.\n\n## Setup\nOpen it.\n\n## Usage\nClick.\n" * 20
+    check_list = checks(BENCH_CHECKS, rng)
+    rows = []
+    for size_mb in BENCH_SIZES_MB:
+        html = document(size_mb, rng)
+        indexed = median_seconds(lambda: validate_checks(html, readme, check_list))
+        old = median_seconds(lambda: rescan(html, readme, check_list)) if size_mb <= BENCH_RESCAN_MAX_MB else None
+        rows.append((size_mb, indexed, old))
+    more_checks = checks(BENCH_CHECKS * 3, rng)
+    triple = median_seconds(lambda: validate_checks(html, readme, more_checks))
+
+    print(f"{BENCH_CHECKS} checks, median of {BENCH_REPEATS}")
+    print(f"{'MB':>5}  {'validate (s)':>12}  {'s per MB':>8}  {'per-check rescan (s)':>20}")
+    for size_mb, indexed, old in rows:
+        old_col = f"{old:20.3f}" if old is not None else f"{'-':>20}"
+        print(f"{size_mb:5g}  {indexed:12.3f}  {indexed / size_mb:8.3f}  {old_col}")
+    print(f"{BENCH_CHECKS * 3} checks at {BENCH_SIZES_MB[-1]:g} MB: {triple:.3f} s")
+
+    growth = (rows[-1][1] / rows[-1][0]) / (rows[0][1] / rows[0][0])
+    print(f"time per MB x{growth:.2f} from {rows[0][0]:g} MB to {rows[-1][0]:g} MB")
+    if growth > BENCH_MAX_GROWTH:
+        print(f"❌ Validation grows faster than linearly (x{growth:.2f} per MB)")
+        sys.exit(1)
+    print("✅ Validation time is near-linear in document size")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Load test: concurrent-task throughput of the old sync pipeline against the async one.
+
+    python bench_pipeline.py
+
+Both modes run BENCH_TASKS round-1 tasks against a local fake GitHub (fake_github.py,
+BENCH_GITHUB_LATENCY_MS per request), the stub LLM provider (BENCH_LLM_SECONDS per
+generation) and a local evaluation server, and stop the clock when the last
+notification arrives. The peak number of live application threads is reported alongside.
+
+- sync: every task runs start to finish as one blocking function on a pool of
+  BENCH_THREADS threads, as FastAPI's BackgroundTasks did (its default pool is 40).
+- async: tasks are POSTed to /api-endpoint of app.main and run on the event loop
+  through the job queue; threads are only used for PyGithub calls.
+
+Fails (exit 1) when the async pipeline has the lower throughput.
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from fake_github import FakeGitHub
+
+BENCH_TASKS = int(os.getenv("BENCH_TASKS", "100"))
+BENCH_THREADS = int(os.getenv("BENCH_THREADS", "40"))
+BENCH_LLM_SECONDS = float(os.getenv("BENCH_LLM_SECONDS", "5"))
+BENCH_GITHUB_LATENCY_MS = float(os.getenv("BENCH_GITHUB_LATENCY_MS", "20"))
+BENCH_TIMEOUT = float(os.getenv("BENCH_TIMEOUT", "300"))
+CHECKS = ["Page has a title", "README.md has an overview"]
+
+
+class Evaluator:
+    """Local evaluation server recording when each task's notification arrives."""
+
+    def __init__(self):
+        self.received = {}
+        self.done = threading.Condition()
+        evaluator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with evaluator.done:
+                    evaluator.received[body["task"]] = time.perf_counter()
+                    evaluator.done.notify_all()
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 256
+        self.url = f"http://127.0.0.1:{self._server.server_port}/notify"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def wait_for(self, tasks, timeout: float) -> float:
+        """perf_counter time of the last notification for `tasks`."""
+        with self.done:
+            self.done.wait_for(lambda: all(t in self.received for t in tasks), timeout)
+            missing = [t for t in tasks if t not in self.received]
+            if missing:
+                raise TimeoutError(f"{len(missing)} tasks were never notified")
+            return max(self.received[t] for t in tasks)
+
+
+def app_threads() -> int:
+    # The fake servers run in this process too; their per-connection threads are left out
+    return sum(1 for t in threading.enumerate() if "process_request_thread" not in t.name)
+
+
+class ThreadPeak:
+    """Samples the number of live application threads while a mode runs."""
+
+    def __enter__(self):
+        self.peak = app_threads()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.05):
+            self.peak = max(self.peak, app_threads())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def request(evaluator, task_id: str) -> dict:
+    return {
+        "secret": "bench", "email": "bench@example.com", "task": task_id, "round": 1,
+        "nonce": task_id, "brief": f"Bench app {task_id}", "checks": CHECKS,
+        "evaluation_url": evaluator.url, "attachments": [],
+    }
+
+
+def run_sync(evaluator, tasks) -> float:
+    from app.llm_generator import generate_app_code
+    from app.checks_validator import validate_checks
+    from app.github_utils import create_repo, publish_files, enable_pages, generate_mit_license
+    from app.http_clients import get_client
+
+    def process(data):
+        # The pre-async pipeline: every step blocks the worker thread until it is done
+        gen = generate_app_code(data["brief"], checks=data["checks"], use_cache=False)
+        files = gen["files"]
+        validate_checks(files["index.html"], files["README.md"], data["checks"])
+        repo = create_repo(data["task"])
+        files["LICENSE"] = generate_mit_license()
+        commit_sha = publish_files(repo, files, "Round 1")["commit_sha"]
+        enable_pages(data["task"])
+        get_client().post(data["evaluation_url"], json={"task": data["task"], "commit_sha": commit_sha})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=BENCH_THREADS) as pool:
+        for task_id in tasks:
+            pool.submit(process, request(evaluator, task_id))
+    return evaluator.wait_for(tasks, BENCH_TIMEOUT) - started
+
+
+def run_async(evaluator, tasks) -> float:
+    from fastapi.testclient import TestClient
+    import app.main
+
+    with TestClient(app.main.app) as client:
+        started = time.perf_counter()
+        for task_id in tasks:
+            r = client.post("/api-endpoint", json=request(evaluator, task_id))
+            assert r.status_code == 200, r.text
+        return evaluator.wait_for(tasks, BENCH_TIMEOUT) - started
+
+
+def main():
+    tmp = tempfile.mkdtemp(prefix="bench_pipeline_")
+    with FakeGitHub(latency_ms=BENCH_GITHUB_LATENCY_MS) as gh:
+        os.environ.update({
+            "GITHUB_API_URL": gh.url, "GITHUB_TOKEN": "bench-token", "GITHUB_USERNAME": gh.login,
+            "GITHUB_SECONDS_BETWEEN_WRITES": "0", "USER_SECRET": "bench",
+            "LLM_PROVIDERS": "stub", "LLM_STUB_DELAY": str(BENCH_LLM_SECONDS), "GEN_CACHE_BYPASS": "true",
+            "PROCESSED_STORE": "memory", "ATTACHMENT_ROOT": os.path.join(tmp, "attachments"),
+            "GEN_CACHE_PATH": os.path.join(tmp, "llm_cache.db"), "WARM_UP_CLIENTS": "false",
+            "PAGES_POLL_INTERVAL": "0.2",
+            # Let the async pipeline keep every task in flight, as the thread pool does up to its size
+            "JOB_WORKERS": str(BENCH_TASKS), "JOB_QUEUE_SIZE": str(BENCH_TASKS),
+            "LLM_CONCURRENCY": str(BENCH_TASKS), "GITHUB_CONCURRENCY": str(BENCH_TASKS),
+        })
+        evaluator = Evaluator()
+        results = {}
+        for mode, run in (("sync", run_sync), ("async", run_async)):
+            with ThreadPeak() as threads:
+                seconds = run(evaluator, [f"{mode}-{i}" for i in range(BENCH_TASKS)])
+            results[mode] = (seconds, threads.peak)
+
+    print(f"{BENCH_TASKS} tasks, LLM {BENCH_LLM_SECONDS:g} s, GitHub latency {BENCH_GITHUB_LATENCY_MS:.0f} ms, "
+          f"sync pool of {BENCH_THREADS} threads")
+    for mode, (seconds, peak) in results.items():
+        print(f"  {mode:6s} {seconds:6.2f} s  {BENCH_TASKS / seconds:6.1f} tasks/s  peak {peak} threads")
+    sync_s, async_s = results["sync"][0], results["async"][0]
+    if async_s >= sync_s:
+        print("❌ Async pipeline is not faster")
+        sys.exit(1)
+    print(f"✅ Async pipeline x{sync_s / async_s:.1f} throughput")
+
+
+if __name__ == "__main__":
+    main()
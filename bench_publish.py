@@ -0,0 +1,101 @@
+"""
+Publishing benchmark: per-file contents-API commits against one Git Data API commit.
+
+    python bench_publish.py
+
+Runs against a local fake GitHub (fake_github.py) with BENCH_LATENCY_MS (default 50)
+added to every request. Each mode publishes a round-1 task (index.html, README.md,
+LICENSE and BENCH_ATTACHMENTS binary attachments with their .b64 backups) and then a
+round-2 update of index.html and README.md, in a fresh repo. Prints wall time and API
+requests per mode. A last publish_files run gets a 403 and a 429 secondary rate-limit
+response from the fake, to check they reach RateLimitedGitHub (which halves its
+parallelism) instead of being retried out of sight. Fails (exit 1) when publish_files
+is not faster and cheaper, or when the rate limits were not seen.
+"""
+import os
+import sys
+import time
+
+from fake_github import FakeGitHub
+
+BENCH_LATENCY_MS = float(os.getenv("BENCH_LATENCY_MS", "50"))
+BENCH_ATTACHMENTS = int(os.getenv("BENCH_ATTACHMENTS", "3"))
+
+
+def task_files(round_num: int) -> dict:
+    files = {
+        "index.html": f"<html><body><h1>Round {round_num}</h1></body></html>\n",
+        "README.md": f"# Bench app\n\nRound {round_num}\n",
+    }
+    if round_num == 1:
+        for i in range(BENCH_ATTACHMENTS):
+            files[f"image{i}.png"] = os.urandom(20_000)
+    return files
+
+
+def per_file(github_utils, repo, files):
+    # What process_request did before: one contents-API commit per file, then list commits
+    for path, content in files.items():
+        if isinstance(content, bytes):
+            github_utils.create_or_update_binary_file(repo, path, content, f"Add binary {path}")
+            b64 = github_utils.base64.b64encode(content).decode("utf-8")
+            github_utils.create_or_update_file(repo, f"attachments/{path}.b64", b64, f"Backup {path}.b64")
+        else:
+            github_utils.create_or_update_file(repo, path, content, f"Add/Update {path}")
+    github_utils.create_or_update_file(repo, "LICENSE", github_utils.generate_mit_license(), "Add MIT license")
+    return repo.get_commits()[0].sha
+
+
+def single_commit(github_utils, repo, files):
+    publish = {}
+    for path, content in files.items():
+        publish[path] = content
+        if isinstance(content, bytes):
+            publish[f"attachments/{path}.b64"] = github_utils.base64.b64encode(content).decode("ascii")
+    publish["LICENSE"] = github_utils.generate_mit_license()
+    return github_utils.publish_files(repo, publish, "Bench commit")["commit_sha"]
+
+
+def main():
+    with FakeGitHub(latency_ms=BENCH_LATENCY_MS) as gh:
+        os.environ.update({
+            "GITHUB_API_URL": gh.url, "GITHUB_TOKEN": "bench-token", "GITHUB_USERNAME": gh.login,
+            # Time the API round trips, not PyGithub's fixed pause between writes
+            "GITHUB_SECONDS_BETWEEN_WRITES": "0",
+        })
+        from app import github_utils
+
+        results = {}
+        for mode, publish in (("per-file", per_file), ("publish_files", single_commit)):
+            repo = github_utils.create_repo(f"bench-{mode}")
+            before = gh.total_requests
+            started = time.perf_counter()
+            for round_num in (1, 2):
+                publish(github_utils, repo, task_files(round_num))
+            results[mode] = (time.perf_counter() - started, gh.total_requests - before)
+
+        # Retry-After 0 keeps the run short; the client still has to notice and back off
+        repo = github_utils.create_repo("bench-rate-limited")
+        gh.throttle(1, status=403, retry_after=0)
+        gh.throttle(1, status=429, retry_after=0)
+        single_commit(github_utils, repo, task_files(1))
+        limited = github_utils.github_client.stats()
+
+    print(f"Fake GitHub latency {BENCH_LATENCY_MS:.0f} ms, {BENCH_ATTACHMENTS} binary attachments, rounds 1+2")
+    for mode, (seconds, requests) in results.items():
+        print(f"  {mode:14s} {seconds:6.2f} s  {requests:4d} API requests")
+    (old_s, old_n), (new_s, new_n) = results["per-file"], results["publish_files"]
+    print(f"  speedup x{old_s / new_s:.1f}, {old_n - new_n} fewer requests against the rate limit")
+    print(f"  rate limited: fake sent {gh.rate_limited}, client saw {limited['rate_limited']}, "
+          f"parallelism {limited['parallel']}/{limited['max_parallel']}")
+    if new_s >= old_s or new_n >= old_n:
+        print("❌ publish_files is not ahead of per-file commits")
+        sys.exit(1)
+    if limited["rate_limited"] < gh.rate_limited or limited["parallel"] >= limited["max_parallel"]:
+        print("❌ Rate-limit responses did not reach the adaptive throttle")
+        sys.exit(1)
+    print("✅ publish_files is faster and uses fewer API requests; rate limits back off")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Processed-request store benchmark: lookup latency as the number of keys grows.
+
+    python bench_store.py
+
+Fills a fresh SQLiteStore (app/store.py) in a temporary directory up to each size in
+BENCH_SIZES (default 1000,10000,100000,200000) and times BENCH_LOOKUPS random gets of
+existing keys plus misses at that size. For comparison it also times the old approach,
+loading the JSON file for every lookup, up to BENCH_JSON_MAX keys. Fails (exit 1) when
+the median lookup at the largest size is more than BENCH_MAX_GROWTH (default 3) times
+the one at the smallest.
+"""
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import statistics
+
+from app.store import SQLiteStore
+
+BENCH_SIZES = [int(n) for n in os.getenv("BENCH_SIZES", "1000,10000,100000,200000").split(",")]
+BENCH_LOOKUPS = int(os.getenv("BENCH_LOOKUPS", "2000"))
+BENCH_JSON_MAX = int(os.getenv("BENCH_JSON_MAX", "10000"))
+BENCH_MAX_GROWTH = float(os.getenv("BENCH_MAX_GROWTH", "3"))
+
+
+def key(i: int) -> str:
+    return f"user{i}@example.com::task-{i}::round1::nonce{i:08x}"
+
+
+def payload(i: int) -> dict:
+    return {
+        "email": f"user{i}@example.com", "task": f"task-{i}", "round": 1, "nonce": f"{i:08x}",
+        "repo_url": f"https://github.com/bench/task-{i}", "commit_sha": f"{i:040x}",
+        "pages_url": f"https://bench.github.io/task-{i}/",
+    }
+
+
+def median_us(fn, keys) -> float:
+    samples = []
+    for k in keys:
+        started = time.perf_counter()
+        fn(k)
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def main():
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteStore(os.path.join(tmp, "bench.db"), table="processed")
+        json_path = os.path.join(tmp, "processed_requests.json")
+        filled = 0
+        for size in BENCH_SIZES:
+            store.put_many((key(i), payload(i)) for i in range(filled, size))
+            filled = size
+            hits = [key(random.randrange(size)) for _ in range(BENCH_LOOKUPS)]
+            misses = [key(size + i) for i in range(BENCH_LOOKUPS)]
+            hit_us = median_us(store.get, hits)
+            miss_us = median_us(store.get, misses)
+
+            json_us = None
+            if size <= BENCH_JSON_MAX:
+                with open(json_path, "w") as f:
+                    json.dump({key(i): payload(i) for i in range(size)}, f, indent=2)
+
+                def json_get(k):
+                    with open(json_path) as f:
+                        return json.load(f).get(k)
+
+                json_us = median_us(json_get, hits[:50])
+            rows.append((size, hit_us, miss_us, json_us))
+
+    print(f"{'keys':>8}  {'hit (us)':>9}  {'miss (us)':>9}  {'JSON file (us)':>14}")
+    for size, hit_us, miss_us, json_us in rows:
+        json_col = f"{json_us:14.0f}" if json_us is not None else f"{'-':>14}"
+        print(f"{size:8d}  {hit_us:9.1f}  {miss_us:9.1f}  {json_col}")
+
+    growth = rows[-1][1] / rows[0][1]
+    print(f"median hit latency x{growth:.2f} from {rows[0][0]} to {rows[-1][0]} keys")
+    if growth > BENCH_MAX_GROWTH:
+        print(f"❌ Lookup latency grows more than x{BENCH_MAX_GROWTH:g}")
+        sys.exit(1)
+    print("✅ Lookup latency stays flat")
+
+
+if __name__ == "__main__":
+    main()
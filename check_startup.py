@@ -0,0 +1,93 @@
+"""
+Cold-start check: import time of app.main and time to the first accepted /api-endpoint response.
+
+    python check_startup.py
+
+Fails (exit 1) when either exceeds its budget:
+IMPORT_BUDGET_MS (default 1000) and FIRST_ACK_BUDGET_MS (default 1500).
+"""
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+FIRST_ACK_BUDGET_MS = float(os.getenv("FIRST_ACK_BUDGET_MS", "1500"))
+
+# Runs in a fresh interpreter: process start -> import -> lifespan startup -> first response.
+# The request is valid, so the ack covers the duplicate lookup, attachment decode, journal
+# write and queue submit; the job itself sits in the slow stub LLM until shutdown cancels it.
+FIRST_ACK_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+from fastapi.testclient import TestClient
+import app.main
+with TestClient(app.main.app) as client:
+    r = client.post("/api-endpoint", json={
+        "secret": "startup-check", "email": "startup@example.com", "task": "startup-check", "round": 1,
+        "nonce": "n", "brief": "Startup check", "checks": [], "evaluation_url": "http://127.0.0.1:9/notify",
+        "attachments": [{"name": "a.txt", "url": "data:text/plain;base64,aGVsbG8="}],
+    })
+    t1 = time.perf_counter()
+print(json.dumps({"status": r.status_code, "body": r.json(), "ms": (t1 - t0) * 1000}))
+"""
+
+
+def first_ack_env(tmp: str) -> dict:
+    """Environment for an accepted request that touches nothing outside `tmp`."""
+    return dict(
+        os.environ,
+        USER_SECRET="startup-check",
+        LLM_PROVIDERS="stub",
+        LLM_STUB_DELAY="60",
+        GITHUB_API_URL="http://127.0.0.1:9",
+        PROCESSED_STORE="sqlite",
+        PROCESSED_DB_PATH=os.path.join(tmp, "processed.db"),
+        GEN_CACHE_PATH=os.path.join(tmp, "llm_cache.db"),
+        ATTACHMENT_ROOT=os.path.join(tmp, "attachments"),
+    )
+
+
+def import_times():
+    """Cumulative microseconds per module from python -X importtime."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        capture_output=True, text=True, check=True,
+    ).stderr
+    times = {}
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        times[name] = int(cumulative)
+    return times
+
+
+def main():
+    times = import_times()
+    total_ms = times.get("app.main", 0) / 1000
+    print(f"import app.main: {total_ms:.0f} ms (budget {IMPORT_BUDGET_MS:.0f} ms)")
+    heaviest = sorted(((t, n) for n, t in times.items() if "." not in n or n.startswith("app.")), reverse=True)
+    for t, name in heaviest[:10]:
+        print(f"  {t / 1000:8.1f} ms  {name}")
+
+    with tempfile.TemporaryDirectory(prefix="check_startup_") as tmp:
+        out = subprocess.run(
+            [sys.executable, "-c", FIRST_ACK_SCRIPT], capture_output=True, text=True, check=True,
+            env=first_ack_env(tmp),
+        ).stdout
+    first_ack = json.loads(out.strip().splitlines()[-1])
+    print(f"first /api-endpoint response: {first_ack['ms']:.0f} ms (budget {FIRST_ACK_BUDGET_MS:.0f} ms)")
+    if first_ack["body"].get("status") != "accepted":
+        print(f"❌ First request was not accepted: {first_ack['status']} {first_ack['body']}")
+        sys.exit(1)
+
+    if total_ms > IMPORT_BUDGET_MS or first_ack["ms"] > FIRST_ACK_BUDGET_MS:
+        print("❌ Cold start over budget")
+        sys.exit(1)
+    print("✅ Cold start within budget")
+
+
+if __name__ == "__main__":
+    main()
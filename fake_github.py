@@ -0,0 +1,243 @@
+"""
+In-memory stand-in for the parts of the GitHub REST API the app uses, for the bench scripts.
+
+    from fake_github import FakeGitHub
+    with FakeGitHub(latency_ms=50) as gh:
+        os.environ["GITHUB_API_URL"] = gh.url   # before importing app.*
+
+Covers repos, the contents API, the Git Data API (blobs, trees, commits, refs), commit
+listing and Pages. Every response carries X-RateLimit-* headers that count down like
+GitHub's, and `latency_ms` is added to each request to stand in for the network.
+`requests` counts calls per "METHOD /route". throttle(n) makes the next n requests fail
+with a secondary rate-limit error (403 or 429 with Retry-After), as GitHub does under
+bursts of writes.
+"""
+import re
+import json
+import time
+import base64
+import hashlib
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open many connections at once
+    request_queue_size = 256
+
+
+def _sha(kind: str, data: bytes) -> str:
+    return hashlib.sha1(b"%s %d\0" % (kind.encode(), len(data)) + data).hexdigest()
+
+
+class FakeGitHub:
+    def __init__(self, login: str = "bench", latency_ms: float = 0.0, rate_limit: int = 5000):
+        self.login = login
+        self.latency = latency_ms / 1000
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.requests = Counter()
+        self.repos = {}
+        self.rate_limited = 0
+        self._throttle = []
+        self._lock = threading.Lock()
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def throttle(self, count: int, status: int = 403, retry_after: float = 1) -> None:
+        """Answer the next `count` requests with a secondary rate-limit error."""
+        with self._lock:
+            self._throttle.extend([(status, retry_after)] * count)
+
+    @property
+    def total_requests(self) -> int:
+        return sum(self.requests.values())
+
+    # --- object store -------------------------------------------------------
+
+    def _repo_json(self, name: str) -> dict:
+        full = f"{self.login}/{name}"
+        return {
+            "id": abs(hash(full)) % 10 ** 8, "name": name, "full_name": full,
+            "owner": {"login": self.login}, "private": False,
+            "url": f"{self.url}/repos/{full}", "html_url": f"https://github.com/{full}",
+            "default_branch": "main",
+        }
+
+    def _commit(self, repo: dict, tree: dict, parents: list, message: str) -> str:
+        tree_sha = _sha("tree", json.dumps(sorted(tree.items())).encode())
+        repo["trees"][tree_sha] = dict(tree)
+        sha = _sha("commit", json.dumps([tree_sha, parents, message, time.time()]).encode())
+        repo["commits"][sha] = {"tree": tree_sha, "parents": parents, "message": message}
+        return sha
+
+    def _commit_json(self, name: str, sha: str) -> dict:
+        base = f"{self.url}/repos/{self.login}/{name}"
+        c = self.repos[name]["commits"][sha]
+        return {
+            "sha": sha, "url": f"{base}/git/commits/{sha}", "message": c["message"],
+            "tree": {"sha": c["tree"], "url": f"{base}/git/trees/{c['tree']}"},
+            "parents": [{"sha": p, "url": f"{base}/git/commits/{p}"} for p in c["parents"]],
+        }
+
+    def _ref_json(self, name: str) -> dict:
+        base = f"{self.url}/repos/{self.login}/{name}"
+        sha = self.repos[name]["head"]
+        return {"ref": "refs/heads/main", "url": f"{base}/git/refs/heads/main",
+                "object": {"sha": sha, "type": "commit", "url": f"{base}/git/commits/{sha}"}}
+
+    def _head_tree(self, repo: dict) -> dict:
+        return dict(repo["trees"][repo["commits"][repo["head"]]["tree"]]) if repo["head"] else {}
+
+    # --- routing ------------------------------------------------------------
+
+    def _route(self, method: str, path: str, body: dict):
+        if method == "GET" and path == "/user":
+            return 200, {"login": self.login, "url": f"{self.url}/user"}, "GET /user"
+        if method == "POST" and path == "/user/repos":
+            name = body["name"]
+            self.repos.setdefault(name, {"head": None, "blobs": {}, "trees": {}, "commits": {}, "pages": False})
+            return 201, self._repo_json(name), "POST /user/repos"
+
+        m = re.match(r"^/repos/[^/]+/([^/]+)(/.*)?$", path)
+        if not m or m.group(1) not in self.repos:
+            return 404, {"message": "Not Found"}, f"{method} /repos/*"
+        name, rest = m.group(1), m.group(2) or ""
+        repo = self.repos[name]
+
+        if rest == "":
+            return 200, self._repo_json(name), f"{method} /repos/:repo"
+        if rest.startswith("/contents/"):
+            file_path = unquote(rest[len("/contents/"):])
+            tree = self._head_tree(repo)
+            if method == "GET":
+                sha = tree.get(file_path)
+                if sha is None:
+                    return 404, {"message": "Not Found"}, "GET contents"
+                return 200, {
+                    "type": "file", "path": file_path, "name": file_path.split("/")[-1], "sha": sha,
+                    "encoding": "base64", "content": base64.b64encode(repo["blobs"][sha]).decode(),
+                    "url": f"{self.url}/repos/{self.login}/{name}/contents/{file_path}",
+                }, "GET contents"
+            if body.get("sha", tree.get(file_path)) != tree.get(file_path):
+                return 409, {"message": "sha mismatch"}, "PUT contents"
+            data = base64.b64decode(body["content"])
+            sha = _sha("blob", data)
+            repo["blobs"][sha] = data
+            tree[file_path] = sha
+            repo["head"] = self._commit(repo, tree, [repo["head"]] if repo["head"] else [], body["message"])
+            return 201, {"content": {"path": file_path, "sha": sha, "type": "file"},
+                         "commit": self._commit_json(name, repo["head"])}, "PUT contents"
+        if rest == "/git/ref/heads/main" or rest == "/git/refs/heads/main":
+            if repo["head"] is None:
+                return 409, {"message": "Git Repository is empty."}, f"{method} ref"
+            if method == "PATCH":
+                if repo["head"] not in repo["commits"][body["sha"]]["parents"]:
+                    return 422, {"message": "Update is not a fast forward"}, "PATCH ref"
+                repo["head"] = body["sha"]
+            return 200, self._ref_json(name), f"{method} ref"
+        if method == "GET" and rest.startswith("/git/commits/"):
+            return 200, self._commit_json(name, rest.rsplit("/", 1)[1]), "GET git commit"
+        if method == "GET" and rest.startswith("/git/trees/"):
+            sha = rest.rsplit("/", 1)[1]
+            entries = [{"path": p, "mode": "100644", "type": "blob", "sha": s}
+                       for p, s in sorted(repo["trees"][sha].items())]
+            return 200, {"sha": sha, "tree": entries, "truncated": False}, "GET git tree"
+        if method == "GET" and rest.startswith("/git/blobs/"):
+            sha = rest.rsplit("/", 1)[1]
+            return 200, {"sha": sha, "encoding": "base64",
+                         "content": base64.b64encode(repo["blobs"][sha]).decode()}, "GET git blob"
+        if method == "POST" and rest == "/git/blobs":
+            data = base64.b64decode(body["content"]) if body.get("encoding") == "base64" else body["content"].encode()
+            sha = _sha("blob", data)
+            repo["blobs"][sha] = data
+            return 201, {"sha": sha, "url": f"{self.url}/repos/{self.login}/{name}/git/blobs/{sha}"}, "POST git blob"
+        if method == "POST" and rest == "/git/trees":
+            tree = dict(repo["trees"][body["base_tree"]]) if body.get("base_tree") else {}
+            for el in body["tree"]:
+                if "content" in el:
+                    data = el["content"].encode("utf-8")
+                    repo["blobs"][_sha("blob", data)] = data
+                    tree[el["path"]] = _sha("blob", data)
+                else:
+                    tree[el["path"]] = el["sha"]
+            sha = _sha("tree", json.dumps(sorted(tree.items())).encode())
+            repo["trees"][sha] = tree
+            return 201, {"sha": sha, "tree": [], "url": f"{self.url}/repos/{self.login}/{name}/git/trees/{sha}"}, "POST git tree"
+        if method == "POST" and rest == "/git/commits":
+            sha = _sha("commit", json.dumps([body["tree"], body["parents"], body["message"], time.time()]).encode())
+            repo["commits"][sha] = {"tree": body["tree"], "parents": body["parents"], "message": body["message"]}
+            return 201, self._commit_json(name, sha), "POST git commit"
+        if method == "GET" and rest == "/commits":
+            return 200, [self._commit_json(name, repo["head"])] if repo["head"] else [], "GET commits"
+        if rest == "/pages" or rest == "/pages/builds/latest":
+            if method == "POST":
+                repo["pages"] = True
+                return 201, {"status": "queued"}, "POST pages"
+            if not repo["pages"]:
+                return 404, {"message": "Not Found"}, f"GET {rest}"
+            return 200, {"status": "built", "commit": repo["head"]}, f"GET {rest}"
+        return 404, {"message": f"no fake for {method} {rest}"}, f"{method} unhandled"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _serve(self, method):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}") if length else {}
+                if fake.latency:
+                    time.sleep(fake.latency)
+                retry_after = None
+                with fake._lock:
+                    if fake._throttle:
+                        status, retry_after = fake._throttle.pop(0)
+                        data = {"message": "You have exceeded a secondary rate limit. Please wait a few minutes "
+                                           "before you try again.",
+                                "documentation_url": "https://docs.github.com/rest/overview/rate-limits-for-the-rest-api"}
+                        route = f"{status} rate limited"
+                        fake.rate_limited += 1
+                    else:
+                        status, data, route = fake._route(method, urlparse(self.path).path, body)
+                    fake.requests[route] += 1
+                    fake.remaining = max(fake.remaining - 1, 0)
+                    remaining = fake.remaining
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                if retry_after is not None:
+                    self.send_header("Retry-After", f"{retry_after:g}")
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("X-RateLimit-Limit", str(fake.rate_limit))
+                self.send_header("X-RateLimit-Remaining", str(remaining))
+                self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._serve("GET")
+
+            def do_POST(self):
+                self._serve("POST")
+
+            def do_PUT(self):
+                self._serve("PUT")
+
+            def do_PATCH(self):
+                self._serve("PATCH")
+
+        return Handler